@@ -1,22 +1,94 @@
+import os
+
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.colors import ListedColormap
-import tqdm
+
+from stencil import compile_geometry, compile_links, exchange_links, FusedStencil
+from implicit import ADIIntegrator
+from jit import JitStencil, HAVE_NUMBA
+from sparse import SparseStencil, compile_sparse_layout
+from radiators import Radiators, source_scale
+from snapshots import SnapshotWriter
+from floorplan import PLAN_PATH, compile_plan, rasterise
+from profiling import NO_PROFILER
+from weather import WeatherSeries
 
 
+def time_steps(steps, progress: bool = True):
+    # the simulation core only needs NumPy; tqdm is imported when a progress bar is actually shown
+    if not progress:
+        return steps
+    import tqdm
+    return tqdm.tqdm(steps, desc="TIME STEPS")
+
 
 class HeatingModel:
-    def __init__(self, parameters: dict):
+    def __init__(self, parameters: dict, engine: str = "rooms"):
         self.parameters = parameters
         self.partial_matrix = {}
-        self.result_matrix = np.zeros((100, 100))
-        self.mask_matrix = np.zeros((100, 100))
+        shape = tuple(parameters["domain"].get("shape", (100, 100)))
+        if engine not in ("rooms", "fused", "jit", "jit_parallel", "sparse", "sparse32", "adi"):
+            raise ValueError(f"unknown engine {engine!r}")
+        self.engine = engine
+        self.stencil = None
         self.index = {"windows": 1, "walls": 2, "doors": 3, "radiators": 5}
+        self.heatingData = []
+        self.links = dict(zip(("link_index", "link_partner", "link_weight"),
+                              compile_links(self.parameters, shape)))
+        self.snapshots, self.snapshot_times = None, None
+        self.profiler = NO_PROFILER
+        if engine.startswith("sparse"):
+            # only room cells are kept; result_matrix is filled from them when something reads it
+            self.build_partial_matrix()
+            layout = compile_sparse_layout(self.parameters, shape)
+            radiators = Radiators(self.parameters, layout) if Radiators.available(self.parameters) else None
+            self.stencil = SparseStencil(layout, radiators=radiators,
+                                         dtype=np.float32 if engine == "sparse32" else np.float64)
+            self.stencil.load_rooms(self.partial_matrix)
+            self.partial_matrix = {}
+            self.mask_matrix, self.source_scale = None, None
+            if radiators is None:
+                # force_term is a function on the full grid, so without radiators its inputs are too
+                self.mask_matrix = np.zeros(shape)
+                self.build_mask_matrix()
+                self.source_scale = source_scale(self.parameters, shape)
+            return
+        self.result_matrix = np.zeros(shape)
+        self.mask_matrix = np.zeros(shape)
         self.build_partial_matrix()
         self.build_result_matrix()
         self.build_mask_matrix()
         self.build_apartment()
-        self.heatingData = []
+        # force_term is a power density; radiators get it over their plan area (see radiators.source_scale)
+        self.source_scale = source_scale(self.parameters, shape)
+        if engine != "rooms":
+            self.build_partial_matrix()
+            geometry = compile_geometry(self.parameters, self.result_matrix.shape)
+            radiators = Radiators(self.parameters, geometry) if Radiators.available(self.parameters) else None
+            if engine == "fused":
+                self.stencil = FusedStencil(geometry, radiators=radiators)
+            elif engine.startswith("jit"):
+                # jit_parallel splits the rows of the grid between threads; without numba the same scheme
+                # runs on the NumPy kernels
+                if HAVE_NUMBA:
+                    self.stencil = JitStencil(geometry, radiators=radiators, parallel=engine == "jit_parallel")
+                else:
+                    self.stencil = FusedStencil(geometry, radiators=radiators)
+            else:
+                self.stencil = ADIIntegrator(geometry, self.parameters, radiators=radiators)
+
+    @property
+    def result_matrix(self):
+        if isinstance(self.stencil, SparseStencil):
+            return self.stencil.mirror()
+        return self.grid_matrix
+
+    @result_matrix.setter
+    def result_matrix(self, value):
+        # e.g. model.result_matrix -= 273 on a sparse engine reaches its compact array
+        if isinstance(self.stencil, SparseStencil):
+            self.stencil.load(value)
+        else:
+            self.grid_matrix = value
 
     def build_partial_matrix(self):
         for room in self.parameters["rooms"].keys():
@@ -43,17 +115,27 @@ class HeatingModel:
 
 
     def evolve_in_unit_timestep(self, dt: float):
+        profiler = self.profiler
+        profiler.start()
+        if self.stencil is not None:
+            self.heatingData.append(self.stencil.step(self, dt))
+            self.parameters["current_time"] += dt
+            profiler.stop()
+            return self
         coefficient = self.parameters["diffusion"] * dt / self.parameters["domain"]["dx"] ** 2
         force_term_full = self.parameters["force_term"](self.parameters["domain"]["grid"],
                                                     self.parameters["current_time"],
-                                                    self.mask_matrix)
+                                                    self.mask_matrix) * self.source_scale
+        profiler.lap("force_term")
 
         for key in self.parameters["windows"].keys():
             self.result_matrix[
                 self.parameters["windows"][key]["rowmin"]: self.parameters["windows"][key]["rowmax"],
                 self.parameters["windows"][key]["colmin"]: self.parameters["windows"][key]["colmax"]
             ] = self.parameters["window_temp"](self.parameters["current_time"])
+        profiler.lap("windows")
         self.build_partial_matrix()
+        profiler.lap("partial_matrix")
         for key in self.parameters["rooms"].keys():
             if np.mean(self.partial_matrix[key]) > self.parameters["rooms"][key]["temp"]:
                 force_term_full[
@@ -69,11 +151,16 @@ class HeatingModel:
                                                         self.parameters["rooms"][key]["rowmin"]+1: self.parameters["rooms"][key]["rowmax"]-1,
                                                         self.parameters["rooms"][key]["colmin"]+1: self.parameters["rooms"][key]["colmax"]-1
                                                     ]
+        profiler.lap("room_stencils")
+        # rooms do not share cells, so their Neumann boundaries can be copied after all stencils
+        for key in self.parameters["rooms"].keys():
             self.partial_matrix[key][0, :] = self.partial_matrix[key][1, :]
             self.partial_matrix[key][-1, :] = self.partial_matrix[key][-2, :]
             self.partial_matrix[key][:, 0] = self.partial_matrix[key][:, 1]
             self.partial_matrix[key][:, -1] = self.partial_matrix[key][:, -2]
+        profiler.lap("neumann")
         self.build_result_matrix()
+        profiler.lap("result_matrix")
         for key in self.parameters["doors"].keys():
             self.result_matrix[
                 self.parameters["doors"][key]["rowmin"]: self.parameters["doors"][key]["rowmax"],
@@ -83,166 +170,348 @@ class HeatingModel:
                             self.parameters["doors"][key]["colmin"]: self.parameters["doors"][key]["colmax"]
                         ]
                         )
+        profiler.lap("doors")
+        if self.links["link_index"].size:
+            exchange_links(self.result_matrix.reshape(1, -1), self.links)
+            profiler.lap("links")
         self.build_partial_matrix()
-        self.heatingData.append(np.sum(force_term_full))
+        profiler.lap("partial_matrix")
+        self.heatingData.append(np.sum(force_term_full) * self.parameters["domain"]["dx"] ** 2)
         self.parameters["current_time"] += dt
+        profiler.stop()
         return self
 
-    def evolve(self, n_steps: int, dt: float):
-        for _ in tqdm.tqdm(range(n_steps), desc="TIME STEPS"):
+    def evolve(self, n_steps: int, dt: float, progress: bool = True, snapshots: list = None,
+               snapshot_path: str = None, checkpoint_every: int = None, checkpoint_path: str = None,
+               monitor=None, profiler=None, metrics=None, frames=None):
+        # snapshots: step numbers (0..n_steps) after which result_matrix is stored in self.snapshots;
+        # monitor: e.g. a convergence.ConvergenceMonitor that may end the run before n_steps;
+        # profiler: e.g. a profiling.StepProfiler collecting time per phase of every step;
+        # metrics: e.g. a metrics.MetricsAccumulator gathering energy and comfort numbers during the run;
+        # frames: e.g. a render.FrameStream drawing the grid in a background thread while the run goes on
+        self.profiler = profiler if profiler is not None else NO_PROFILER
+        if metrics is not None:
+            metrics.start(self, dt, n_steps)
+        if frames is not None:
+            frames.start(self, dt, n_steps)
+        self.heatingData = list(self.heating_steps())
+        if monitor is not None:
+            monitor.start(self, dt)
+        schedule = sorted(set(snapshots)) if snapshots is not None else []
+        writer = SnapshotWriter(self.result_matrix.shape, len(schedule), snapshot_path) if schedule else None
+        position = 0
+        if schedule and schedule[0] == 0:
+            writer.write(self.result_matrix, self.parameters["current_time"])
+            position += 1
+        for step in time_steps(range(1, n_steps + 1), progress):
             self.evolve_in_unit_timestep(dt)
+            if position < len(schedule) and schedule[position] == step:
+                writer.write(self.result_matrix, self.parameters["current_time"])
+                position += 1
+            if metrics is not None:
+                metrics.update(self, step, dt)
+            if frames is not None:
+                frames.update(self, step, dt)
+            if checkpoint_every and step % checkpoint_every == 0:
+                self.save_state(checkpoint_path)
+            if monitor is not None and monitor.update(self, step):
+                break
+        # stops tracemalloc if the profiler started it, so later runs are not slowed down by it
+        self.profiler.close()
+        self.profiler = NO_PROFILER
+        if metrics is not None:
+            metrics.finish()
+        if frames is not None:
+            frames.finish()
+        if writer is not None:
+            writer.close()
+            self.snapshots, self.snapshot_times = writer.frames[:writer.count], writer.times[:writer.count]
         self.heatingData = np.cumsum(self.heatingData)
         return self
 
+    def evolve_adaptive(self, duration: float, tolerance: float = 1e-3, dt: float = 0.1, dt_min: float = 1e-3,
+                        dt_max: float = None, outputs: list = None, snapshot_path: str = None,
+                        switch_dt: float = None):
+        # Runs for `duration` with step sizes chosen from a local error estimate: the change of the rate
+        # dT/dt between two steps gives the second derivative, so a step of h is off by about
+        # h^2 / (h + h_previous) * |rate - previous rate|. This costs one step per step, unlike step
+        # doubling. `tolerance` is that error per step in kelvin, the largest over all cells but windows
+        # (they are reset every step anyway). The first step is `dt`; later ones grow from it on a ladder of
+        # dt * 2^(k/4), so that ADI reuses its factorisations. Explicit engines stay below their stability
+        # limit. A thermostat switch is a jump no step size resolves; the engine decides it at the start of
+        # a step, so a switch shows one step late and the step before it is taken again if it was longer
+        # than switch_dt (default force_dt, the step fixed runs switch at). Sources are a rate here (see
+        # FusedStencil.step). `outputs` are times hit exactly and stored like evolve's snapshots; the
+        # accepted step sizes end up in self.step_sizes and their energy in heatingData as usual.
+        if self.stencil is None:
+            raise ValueError("adaptive stepping needs one of the compiled engines, not 'rooms'")
+        geometry = self.stencil.geometry
+        if not isinstance(self.stencil, ADIIntegrator):
+            limit = 0.9 * self.parameters["domain"]["dx"] ** 2 / (4 * self.parameters["diffusion"])
+            dt_max = limit if dt_max is None else min(dt_max, limit)
+        dt_max = np.inf if dt_max is None else dt_max
+        switch_dt = self.parameters.get("force_dt", dt) if switch_dt is None else switch_dt
+        compact = isinstance(self.stencil, SparseStencil)
+        window = geometry["window"] if compact else geometry["window_index"]
+        base = dt
+
+        def ladder(step):
+            return max(dt_min, base * 2 ** (np.floor(4 * np.log2(min(step, dt_max) / base)) / 4))
+
+        def temperatures():
+            # what the engine steps: the compact array of the sparse engines, so the grid is not rebuilt
+            return self.stencil.values if compact else self.result_matrix
+
+        def restore(state, time):
+            temperatures()[...] = state
+            if compact:
+                self.stencil.stale = True
+            self.parameters["current_time"] = time
+
+        self.heatingData = list(self.heating_steps())
+        self.step_sizes = []
+        start = self.parameters["current_time"]
+        end = start + duration
+        stops = sorted(start + time for time in (outputs or []) if 0 <= time <= duration)
+        writer = SnapshotWriter(self.result_matrix.shape, len(stops), snapshot_path) if stops else None
+        position = 0
+        while position < len(stops) and stops[position] <= start:
+            writer.write(self.result_matrix, start)
+            position += 1
+        dt = ladder(dt)
+        initial = temperatures().copy()
+        # the state before the previous step, to take that step again when a switch shows up after it
+        before, before_time, retake = initial.copy(), start, False
+        was_hot, previous_rate, previous_step = None, None, None
+        change = np.empty_like(initial)
+        while self.parameters["current_time"] < end:
+            time = self.parameters["current_time"]
+            target = stops[position] if position < len(stops) else end
+            step = min(dt, target - time)
+            last = step >= target - time
+            heating = self.stencil.step(self, step, rate=True)
+            hot = self.stencil.hot[0].copy()
+            switched = was_hot is not None and np.any(hot != was_hot)
+            if switched and retake:
+                restore(before, before_time)
+                initial[...] = before
+                self.heatingData.pop()
+                self.step_sizes.pop()
+                was_hot, previous_rate, retake = None, None, False
+                dt = ladder(switch_dt)
+                continue
+            np.subtract(temperatures(), initial, out=change)
+            change.flat[window] = 0
+            if switched or previous_rate is None:
+                # the rate jumps where a thermostat switched; the estimate starts afresh after it
+                error, factor = 0.0, 1.0
+            else:
+                error = step ** 2 / (step + previous_step) * np.max(np.abs(change / step - previous_rate))
+                factor = 2.0 if error == 0 else min(2.0, 0.9 * (tolerance / error) ** 0.5)
+            if error > tolerance and step > dt_min:
+                restore(initial, time)
+                dt = ladder(step * max(0.2, factor))
+                continue
+            self.parameters["current_time"] = target if last else time + step
+            self.heatingData.append(heating)
+            self.step_sizes.append(step)
+            # a step that ends on an output time is written out and never taken again
+            before, initial = initial, before
+            before_time, retake = time, step > switch_dt and not last
+            was_hot, previous_rate, previous_step = hot, change / step, step
+            initial[...] = temperatures()
+            while position < len(stops) and stops[position] <= self.parameters["current_time"]:
+                writer.write(self.result_matrix, self.parameters["current_time"])
+                position += 1
+            # a step cut short by an output time does not limit the next one
+            dt = ladder((dt if last and step < dt else step) * factor)
+        if writer is not None:
+            writer.close()
+            self.snapshots, self.snapshot_times = writer.frames[:writer.count], writer.times[:writer.count]
+        self.heatingData = np.cumsum(self.heatingData)
+        return self
+
+    def heating_steps(self):
+        # energy of each step so far, whether heatingData is still per step or already cumulative
+        if isinstance(self.heatingData, np.ndarray):
+            return np.diff(self.heatingData, prepend=0.0)
+        return np.asarray(self.heatingData, dtype=float)
+
+    def save_state(self, path: str):
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as handle:
+            np.savez_compressed(handle, result_matrix=self.result_matrix, heating_steps=self.heating_steps(),
+                                current_time=self.parameters["current_time"], engine=self.engine)
+        os.replace(temporary, path)
+        return path
+
+    def load_state(self, path: str):
+        with np.load(path) as state:
+            if state["result_matrix"].shape != self.result_matrix.shape:
+                raise ValueError(f"checkpoint grid {state['result_matrix'].shape} does not match "
+                                 f"model grid {self.result_matrix.shape}")
+            self.result_matrix[...] = state["result_matrix"]
+            self.heatingData = list(state["heating_steps"])
+            self.parameters["current_time"] = float(state["current_time"])
+        if self.stencil is None:
+            self.build_partial_matrix()
+        if hasattr(self.stencil, "load"):
+            self.stencil.load(self.result_matrix)
+        return self
+
+    @classmethod
+    def from_checkpoint(cls, path: str, parameters: dict, engine: str = "rooms"):
+        return cls(parameters, engine=engine).load_state(path)
+
     def build_apartment(self):
         return self.result_matrix
 
+
+class BatchHeatingModel:
+    def __init__(self, scenarios: list):
+        self.scenarios = scenarios
+        first = scenarios[0]
+        for parameters in scenarios[1:]:
+            # radiators too: the shared stencil places them where the first scenario has them
+            for part in ("rooms", "windows", "doors", "radiators"):
+                if [[key] + [parameters[part][key][side] for side in ("rowmin", "rowmax", "colmin", "colmax")]
+                        for key in parameters.get(part, {}).keys()] != \
+                        [[key] + [first[part][key][side] for side in ("rowmin", "rowmax", "colmin", "colmax")]
+                         for key in first.get(part, {}).keys()]:
+                    raise ValueError(f"all scenarios must share the same {part}")
+            if parameters["diffusion"] != first["diffusion"] or parameters["domain"]["dx"] != first["domain"]["dx"]:
+                raise ValueError("all scenarios must share the same diffusion and dx")
+        models = [HeatingModel(parameters) for parameters in scenarios]
+        self.result_matrix = np.stack([model.result_matrix for model in models])
+        self.mask_matrices = [model.mask_matrix for model in models]
+        self.source_scales = [model.source_scale for model in models]
+        self.setpoint = np.array([[parameters["rooms"][room]["temp"] for room in first["rooms"].keys()]
+                                  for parameters in scenarios], dtype=float)
+        geometry = compile_geometry(first, self.result_matrix.shape[1:])
+        self.radiators = None
+        if all(Radiators.available(parameters) for parameters in scenarios):
+            # radiator_amplitude is shared, taken from the first scenario; only powers differ
+            self.radiators = Radiators(first, geometry, powers=[
+                [parameters["radiators"][name]["power"] for name in first["radiators"].keys()]
+                for parameters in scenarios])
+        self.stencil = FusedStencil(geometry, batch=len(scenarios), radiators=self.radiators)
+        self.force_term_full = np.empty_like(self.result_matrix) if self.radiators is None else None
+        self.window_temp = np.empty(len(scenarios))
+        self.current_time = first["current_time"]
+        self.heatingData = []
+        self.profiler = NO_PROFILER
+
+    def evolve_in_unit_timestep(self, dt: float):
+        self.profiler.start()
+        first = self.scenarios[0]
+        coefficient = first["diffusion"] * dt / first["domain"]["dx"] ** 2
+        for number, parameters in enumerate(self.scenarios):
+            if self.radiators is None:
+                self.force_term_full[number] = parameters["force_term"](parameters["domain"]["grid"],
+                                                                        self.current_time,
+                                                                        self.mask_matrices[number])
+                self.force_term_full[number] *= self.source_scales[number]
+            self.window_temp[number] = parameters["window_temp"](self.current_time)
+        self.profiler.lap("force_term")
+        heating = self.stencil.advance(self.result_matrix,
+                                       None if self.radiators is not None else self.force_term_full,
+                                       self.window_temp, self.setpoint, coefficient,
+                                       self.current_time, first.get("force_dt", dt), self.profiler)
+        self.heatingData.append(heating if self.radiators is not None else heating * first["domain"]["dx"] ** 2)
+        self.current_time += dt
+        self.profiler.stop()
+        return self
+
+    def evolve(self, n_steps: int, dt: float, progress: bool = True, profiler=None):
+        self.profiler = profiler if profiler is not None else NO_PROFILER
+        self.heatingData = list(self.heating_steps())
+        for _ in time_steps(range(n_steps), progress):
+            self.evolve_in_unit_timestep(dt)
+        self.profiler.close()
+        self.profiler = NO_PROFILER
+        # one row of cumulative energy per scenario
+        self.heatingData = np.cumsum(self.heatingData, axis=0).T
+        for parameters in self.scenarios:
+            parameters["current_time"] = self.current_time
+        return self
+
+    def heating_steps(self):
+        # energy of each step so far, one row per step, whether heatingData is still per step or already
+        # cumulative (one row per scenario, as evolve leaves it)
+        if isinstance(self.heatingData, np.ndarray):
+            return np.diff(self.heatingData, axis=1, prepend=0.0).T
+        return np.asarray(self.heatingData, dtype=float).reshape(-1, len(self.scenarios))
+
+    def load_state(self, path: str):
+        # start every scenario from the same saved HeatingModel state; energy is counted from here on
+        with np.load(path) as state:
+            if state["result_matrix"].shape != self.result_matrix.shape[1:]:
+                raise ValueError(f"checkpoint grid {state['result_matrix'].shape} does not match "
+                                 f"model grid {self.result_matrix.shape[1:]}")
+            self.result_matrix[...] = state["result_matrix"]
+            self.current_time = float(state["current_time"])
+        self.heatingData = []
+        return self
+
+
+def initial_temperature(temperature: float):
+    return lambda x: temperature + np.random.random(x.shape)
+
+
+def model_parameters(k1, k2, k3, k4, t1, t2, t3, t4, t5, s1=298, s2=298, s3=298, s4=298, s5=290,
+                     dx: float = 1, plan=PLAN_PATH, weather=None):
+    # plan is a plan dict or the path of a plan file; a file is rasterised and compiled once per process;
+    # weather is a weather.WeatherSeries or a file for WeatherSeries.from_file driving the windows
+    if isinstance(plan, dict):
+        apartment = rasterise(plan, dx)
+    else:
+        plan, apartment, geometry = compile_plan(plan, dx)
+        apartment["geometry"] = geometry
+    for room, init, setpoint in zip(apartment["rooms"].keys(), (t1, t2, t3, t4, t5), (s1, s2, s3, s4, s5)):
+        apartment["rooms"][room].update(init_func=initial_temperature(init), temp=setpoint)
+    powers = np.array([0, k1, k2, k3, k4])
+    for radiator, power in zip(apartment["radiators"].keys(), powers[1:]):
+        apartment["radiators"][radiator]["power"] = power
+    apartment["masks"] = {room: int(plan["rooms"][room].get("heated", True)) for room in plan["rooms"].keys()}
+    apartment.update({
+        "force_term": lambda x, t, mask: np.where(
+            mask > 0, (np.sin(24 * t / 3600) ** 2 + powers[mask.astype(int)]) / 10, 0
+        ),
+        "radiator_amplitude": lambda t: np.sin(24 * t / 3600) ** 2,
+        "window_temp": lambda t: 280 - 10 * np.sin(24 * t / 3600),
+        "force_dt": 0.1,  # force_term is already multiplied by this time step (the /10)
+        "diffusion": 0.1,
+        "current_time": 0.0
+    })
+    if weather is not None:
+        apartment["window_temp"] = weather if isinstance(weather, WeatherSeries) else WeatherSeries.from_file(weather)
+    return apartment
+
+
+def day_timelapse(path: str = "doba.gif", engine: str = "fused"):
+    # a day as a time-lapse, drawn while the simulation runs (one frame every 5 minutes); 864000 steps,
+    # so only on request: python PROJEKTMOD.py --timelapse
+    from render import FrameRenderer, FrameStream
+
+    day = HeatingModel(model_parameters(1, 0, 1, 2, 295, 295, 297, 296, 290), engine=engine)
+    day.evolve(864000, 0.1, frames=FrameStream(FrameRenderer(path, fps=24, vmin=10, vmax=30), every=3000))
+    return path
+
+
 if __name__ == "__main__":
-    def model_parameters(k1, k2, k3, k4, t1, t2, t3, t4, t5):
-        apartment = {
-            "rooms": {  # rooms
-                "A1": { #łązienka
-                    "rowmin": 0, "rowmax": 50, "colmin": 0, "colmax": 40,
-                    "init_func": lambda x: t1 + np.random.random(x.shape), "temp": 298
-                },
-                "A2": { #sypialnia
-                    "rowmin": 0, "rowmax": 50, "colmin": 50, "colmax": 100,
-                    "init_func": lambda x: t2 + np.random.random(x.shape), "temp": 298
-                },
-                "A3": { #korytarz
-                    "rowmin": 0, "rowmax": 50, "colmin": 40, "colmax": 50,
-                    "init_func": lambda x: t3 + np.random.random(x.shape), "temp": 298
-                },
-                "A4": { #salon
-                    "rowmin": 50, "rowmax": 90, "colmin": 0, "colmax": 100,
-                    "init_func": lambda x: t4 + np.random.random(x.shape), "temp": 298
-                },
-                "A5": { #klatka
-                    "rowmin": 90, "rowmax": 100, "colmin": 0, "colmax": 100,
-                    "init_func": lambda x: t5 + np.random.random(x.shape), "temp": 290
-                }
-            },
-            "masks": {"A1": 1, "A2": 1, "A3": 1, "A4": 1, "A5": 0},
-            "radiators": {
-                'R1': {
-                    "rowmin": 47, "rowmax": 48, "colmin": 20, "colmax": 27, "mask_values": 1
-                },
-                'R2': {
-                    "rowmin": 20, "rowmax": 30, "colmin": 97, "colmax": 98, "mask_values": 2
-                },
-                'R3': {
-                    "rowmin": 87, "rowmax": 88, "colmin": 30, "colmax": 45, "mask_values": 3
-                },
-                'R4': {
-                    "rowmin": 2, "rowmax": 3, "colmin": 44, "colmax": 46, "mask_values": 4
-                }
-            },
-            "walls": {  # walls
-                'W1': {
-                    "rowmin": 0, "rowmax": 2, "colmin": 0, "colmax": 100
-                },
-                'W2': {
-                    "rowmin": 2, "rowmax": 20, "colmin": 0, "colmax": 2
-                },
-                'W3': {
-                    "rowmin": 28, "rowmax": 60, "colmin": 0, "colmax": 2
-                },
-                'W4': {
-                    "rowmin": 70, "rowmax": 88, "colmin": 0, "colmax": 2
-                },
-                'W5': {
-                    "rowmin": 2, "rowmax": 20, "colmin": 98, "colmax": 100
-                },
-                'W6': {
-                    "rowmin": 28, "rowmax": 60, "colmin": 98, "colmax": 100
-                },
-                'W7': {
-                    "rowmin": 70, "rowmax": 88, "colmin": 98, "colmax": 100
-                },
-                'W8': {
-                    "rowmin": 88, "rowmax": 90, "colmin": 0, "colmax": 60
-                },
-                'W9': {
-                    "rowmin": 88, "rowmax": 90, "colmin": 65, "colmax": 100
-                },
-                'W10': {
-                    "rowmin": 48, "rowmax": 50, "colmin": 2, "colmax": 38
-                },
-                'W11': {
-                    "rowmin": 48, "rowmax": 50, "colmin": 52, "colmax": 98
-                },
-                'W12': {
-                    "rowmin": 2, "rowmax": 20, "colmin": 38, "colmax": 40
-                },
-                'W13': {
-                    "rowmin": 25, "rowmax": 50, "colmin": 38, "colmax": 40
-                },
-                'W14': {
-                    "rowmin": 2, "rowmax": 20, "colmin": 50, "colmax": 52
-                },
-                'W15': {
-                    "rowmin": 25, "rowmax": 50, "colmin": 50, "colmax": 52
-                },
-                'W16': {
-                    "rowmin": 48, "rowmax": 50, "colmin": 52, "colmax": 98
-                }
-            },
-            "windows": {
-                'O1': {
-                    "rowmin": 20, "rowmax": 28, "colmin": 0, "colmax": 2
-                },
-                'O2': {
-                    "rowmin": 60, "rowmax": 70, "colmin": 0, "colmax": 2
-                },
-                'O3': {
-                    "rowmin": 20, "rowmax": 28, "colmin": 98, "colmax": 100
-                },
-                'O4': {
-                    "rowmin": 60, "rowmax": 70, "colmin": 98, "colmax": 100
-                }
-            },
-            "doors": {
-                'D1': {
-                    "rowmin": 88, "rowmax": 90, "colmin": 60, "colmax": 65
-                },
-                'D2': {
-                    "rowmin": 20, "rowmax": 25, "colmin": 38, "colmax": 40
-                },
-                'D3': {
-                    "rowmin": 20, "rowmax": 25, "colmin": 50, "colmax": 52
-                }
-            },
-            "domain": {
-                "grid": np.meshgrid(np.linspace(-1, 1, 101), np.linspace(-1, 1, 101))[0], "dx": 1
-            },
-            "force_term": lambda x, t, mask: np.where(
-                mask == 1, (np.sin(24 * t / 3600) ** 2 + k1) / 10, np.where(
-                    mask == 2, (np.sin(24 * t / 3600) ** 2 + k2) / 10, np.where(
-                        mask == 3, (np.sin(24 * t / 3600) ** 2 + k3) / 10, np.where(
-                            mask == 4, (np.sin(24 * t / 3600) ** 2 + k4) / 10, 0
-                        )
-                    )
-                )
-            ),
-            "window_temp": lambda t: 280 - 10 * np.sin(24 * t / 3600),
-            "diffusion": 0.1,
-            "current_time": 0.0
-        }
-        return apartment
+    import sys
+
+    import matplotlib.pyplot as plt
+
+    from render import render_frames
 
     def draw(m1, m2, m3, m4):
-        model1 = HeatingModel(m1)
-        model2 = HeatingModel(m2)
-        model3 = HeatingModel(m3)
-        model4 = HeatingModel(m4)
-        model1.evolve(10000, 0.1)
-        model2.evolve(10000, 0.1)
-        model3.evolve(10000, 0.1)
-        model4.evolve(10000, 0.1)
-        plt.plot(model1.heatingData, "red", label=f'Power ={2, 4, 4, 2}')
-        plt.plot(model2.heatingData, "blue", label=f'Power ={1, 2, 3, 4}')
-        plt.plot(model3.heatingData, "green", label=f'Power ={3, 0, 2, 1}')
-        plt.plot(model4.heatingData, "purple", label=f'Power ={1, 0, 1, 2,}')
+        models = BatchHeatingModel([m1, m2, m3, m4])
+        models.evolve(10000, 0.1)
+        plt.plot(models.heatingData[0], "red", label=f'Power ={2, 4, 4, 2}')
+        plt.plot(models.heatingData[1], "blue", label=f'Power ={1, 2, 3, 4}')
+        plt.plot(models.heatingData[2], "green", label=f'Power ={3, 0, 2, 1}')
+        plt.plot(models.heatingData[3], "purple", label=f'Power ={1, 0, 1, 2,}')
         plt.legend(loc="upper left")
         plt.title("Łączne zużycie energii")
         plt.savefig("en.png")
@@ -269,26 +538,9 @@ if __name__ == "__main__":
     draw(a1, a2, a3, a4)
 
     model1 = HeatingModel(a4)
-    m1 = model1.evolve(10801, 0.1)
-    m1.result_matrix -= 273
-    plt.imshow(m1.result_matrix, cmap=plt.get_cmap("coolwarm"))
-    plt.title(f"t = {round(m1.parameters['current_time'], 2)}")
-    plt.colorbar().set_label("Temperature [C]")
-    plt.savefig("t1.png")
-    plt.show()
-    model2 = HeatingModel(a4)
-    m2 = model2.evolve(7201, 0.1)
-    m2.result_matrix -= 273
-    plt.imshow(m2.result_matrix, cmap=plt.get_cmap("coolwarm"))
-    plt.title(f"t = {round(m1.parameters['current_time'], 2)}")
-    plt.colorbar().set_label("Temperature [C]")
-    plt.savefig("t2.png")
-    plt.show()
-    model3 = HeatingModel(a4)
-    m3 = model3.evolve(3601, 0.1)
-    m3.result_matrix -= 273
-    plt.imshow(m3.result_matrix, cmap=plt.get_cmap("coolwarm"))
-    plt.title(f"t = {round(m3.parameters['current_time'], 2)} ")
-    plt.colorbar().set_label("Temperature [C]")
-    plt.savefig("t3.png")
-    plt.show()
+    m1 = model1.evolve(10801, 0.1, snapshots=[3601, 7201, 10801], snapshot_path="snapshots.npy")
+    # t1.png is the last snapshot and t3.png the first, as before
+    render_frames(m1.snapshots[::-1], m1.snapshot_times[::-1], "t{index}.png", start=1, title="t = {time:.2f}")
+
+    if "--timelapse" in sys.argv:
+        day_timelapse()
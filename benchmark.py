@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+
+from PROJEKTMOD import HeatingModel, model_parameters
+from sweep import Scenario, sweep
+from jit import HAVE_NUMBA
+
+POWERS = (1, 0, 1, 2, 295, 295, 297, 296, 290)
+
+
+def machine():
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def bench_step(engine: str, dx: float, n_steps: int = 200, dt: float = 0.1, repeats: int = 3):
+    np.random.seed(0)
+    model = HeatingModel(model_parameters(*POWERS, dx=dx), engine=engine)
+    model.evolve_in_unit_timestep(dt)
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(n_steps):
+            model.evolve_in_unit_timestep(dt)
+        best = min(best, (time.perf_counter() - start) / n_steps)
+    tracemalloc.start()
+    model.evolve_in_unit_timestep(dt)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"engine": engine, "dx": dx, "shape": list(model.result_matrix.shape), "seconds_per_step": best,
+            "cells_per_second": model.result_matrix.size / best, "peak_step_bytes": peak}
+
+
+def bench_evolve(engine: str, horizon: float, dt: float):
+    np.random.seed(0)
+    model = HeatingModel(model_parameters(*POWERS), engine=engine)
+    n_steps = int(round(horizon / dt))
+    start = time.perf_counter()
+    model.evolve(n_steps, dt, progress=False)
+    seconds = time.perf_counter() - start
+    return {"engine": engine, "horizon": horizon, "dt": dt, "steps": n_steps, "seconds": seconds,
+            "steps_per_second": n_steps / seconds, "energy": float(model.heatingData[-1])}
+
+
+def bench_sweep(workers: int, n_scenarios: int = 8, n_steps: int = 2000, dt: float = 0.1, engine: str = "fused"):
+    scenarios = [Scenario(k % 5, (k // 5) % 5, 1, 2) for k in range(n_scenarios)]
+    start = time.perf_counter()
+    sweep(scenarios, n_steps, dt, processes=workers, engine=engine)
+    seconds = time.perf_counter() - start
+    return {"workers": workers, "scenarios": n_scenarios, "steps": n_steps, "seconds": seconds,
+            "scenarios_per_second": n_scenarios / seconds,
+            "children_max_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss}
+
+
+def cross_check(n_steps: int = 1000, dt: float = 0.1, dx: float = 1, powers=POWERS):
+    # the jit and NumPy kernels run the same scheme in the same order, so they should agree to rounding
+    final = {}
+    for engine in ("fused", "jit"):
+        np.random.seed(0)
+        model = HeatingModel(model_parameters(*powers, dx=dx), engine=engine)
+        model.evolve(n_steps, dt, progress=False)
+        final[engine] = model
+    return {"numba": HAVE_NUMBA, "dx": dx, "steps": n_steps,
+            "max_temperature_difference": float(np.abs(final["fused"].result_matrix -
+                                                       final["jit"].result_matrix).max()),
+            "energy_difference": float(final["fused"].heatingData[-1] - final["jit"].heatingData[-1])}
+
+
+def run(quick: bool = False, max_workers: int = None):
+    max_workers = max_workers or os.cpu_count() or 1
+    results = {"machine": machine(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "step": [], "evolve": [],
+               "sweep": []}
+    for engine in ("rooms", "fused", "jit", "jit_parallel", "sparse", "adi") if HAVE_NUMBA else \
+            ("rooms", "fused", "sparse", "adi"):
+        for dx in ((1, 0.5) if quick else (2, 1, 0.5, 0.25)):
+            if engine == "rooms" and dx < 0.5:
+                continue
+            results["step"].append(bench_step(engine, dx, n_steps=50 if quick else 200))
+    horizon = 100.0 if quick else 1000.0
+    results["evolve"].append(bench_evolve("rooms", horizon, 0.1))
+    results["evolve"].append(bench_evolve("fused", horizon, 0.1))
+    if HAVE_NUMBA:
+        results["evolve"].append(bench_evolve("jit", horizon, 0.1))
+    results["evolve"].append(bench_evolve("adi", horizon, 10.0))
+    workers = 1
+    while workers <= max_workers:
+        results["sweep"].append(bench_sweep(workers, n_scenarios=max(2, max_workers) if quick else 4 * max_workers,
+                                            n_steps=200 if quick else 2000))
+        workers *= 2
+    results["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return results
+
+
+def key(section: str, entry: dict):
+    return (section,) + tuple(entry[name] for name in ("engine", "dx", "horizon", "dt", "workers") if name in entry)
+
+
+def compare(baseline: dict, results: dict, threshold: float = 0.1):
+    # time ratio current / baseline for every benchmark present in both; > 1 + threshold is a regression
+    measure = {"step": "seconds_per_step", "evolve": "seconds", "sweep": "seconds"}
+    before = {key(section, entry): entry[measure[section]] for section in measure for entry in baseline[section]}
+    rows = []
+    for section in measure:
+        for entry in results[section]:
+            name = key(section, entry)
+            if name in before:
+                ratio = entry[measure[section]] / before[name]
+                rows.append({"benchmark": name, "ratio": ratio, "regression": ratio > 1 + threshold})
+    if baseline["machine"] != results["machine"]:
+        print("warning: baseline was recorded on a different machine")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HeatingModel benchmarks")
+    parser.add_argument("--quick", action="store_true", help="small sizes, for a smoke run")
+    parser.add_argument("--workers", type=int, default=None, help="largest sweep pool to try")
+    parser.add_argument("--save", default="benchmark.json", help="where to write the results")
+    parser.add_argument("--compare", default=None, help="baseline results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--check", action="store_true", help="only compare the jit kernels with NumPy")
+    arguments = parser.parse_args()
+
+    if arguments.check:
+        checks = [cross_check(dx=dx) for dx in (1, 0.5)]
+        for check in checks:
+            print(f"dx={check['dx']}  max |dT| {check['max_temperature_difference']:.3g}  "
+                  f"energy difference {check['energy_difference']:.3g}")
+        raise SystemExit(0 if all(check["max_temperature_difference"] < 1e-9 for check in checks) else 1)
+
+    results = run(arguments.quick, arguments.workers)
+    with open(arguments.save, "w") as handle:
+        json.dump(results, handle, indent=2)
+    for entry in results["step"]:
+        print(f"step   {entry['engine']:6} {entry['shape']}  {1e6 * entry['seconds_per_step']:9.1f} us")
+    for entry in results["evolve"]:
+        print(f"evolve {entry['engine']:6} {entry['steps']} steps  {entry['seconds']:8.2f} s")
+    for entry in results["sweep"]:
+        print(f"sweep  {entry['workers']} workers  {entry['seconds']:8.2f} s")
+    if arguments.compare:
+        with open(arguments.compare) as handle:
+            rows = compare(json.load(handle), results, arguments.threshold)
+        for row in rows:
+            print(("REGRESSION " if row["regression"] else "           ") + f"{row['benchmark']}  x{row['ratio']:.2f}")
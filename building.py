@@ -0,0 +1,194 @@
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from PROJEKTMOD import HeatingModel, model_parameters
+from floorplan import PARTS, cell_span
+from radiators import Radiators
+from stencil import compile_geometry, compile_links, FusedStencil
+
+
+def building_parameters(floors: int, flats: int, *args, shared_rooms=("A5",), stairs=(0, 10),
+                        wall_transfer: float = 0.5, stair_transfer: float = 0.5, **kwargs):
+    # `flats` copies of the apartment side by side on each of `floors` floors stacked down the grid; args and
+    # kwargs go to model_parameters for every flat. Rooms in shared_rooms (the stairwell, "klatka") become one
+    # room along the whole floor. Rooms of neighbouring flats and floors exchange heat through the walls
+    # between them (wall_transfer), stairwells of consecutive floors through the stairs, which run up the
+    # stairwell between x = stairs[0] and stairs[1] (plan units), left and right half on alternate floors.
+    flat = model_parameters(*args, **kwargs)
+    height, width = flat["domain"]["shape"]
+    dx = flat["domain"]["dx"]
+    parameters = {key: value for key, value in flat.items() if key not in PARTS + ("masks", "domain", "geometry")}
+    parameters.update({part: {} for part in PARTS})
+    parameters["masks"] = {}
+    for floor in range(floors):
+        for number in range(flats):
+            for part in PARTS:
+                for key, coord in flat[part].items():
+                    box = dict(coord, rowmin=coord["rowmin"] + floor * height, rowmax=coord["rowmax"] + floor * height,
+                               colmin=coord["colmin"] + number * width, colmax=coord["colmax"] + number * width)
+                    if part == "windows" and (coord["colmin"] == 0 < number or
+                                              coord["colmax"] == width and number < flats - 1 or
+                                              coord["rowmin"] == 0 < floor or
+                                              coord["rowmax"] == height and floor < floors - 1):
+                        continue  # this window looks into the next flat
+                    if part == "rooms" and key in shared_rooms:
+                        if coord["colmin"] != 0 or coord["colmax"] != width:
+                            raise ValueError(f"shared room {key} must span the whole width of the flat")
+                        name = f"F{floor}/{key}"
+                        if name in parameters["rooms"]:
+                            parameters["rooms"][name]["colmax"] = box["colmax"]
+                            continue
+                    else:
+                        name = f"F{floor}/M{number}/{key}"
+                    parameters[part][name] = box
+                    if part == "rooms":
+                        parameters["masks"][name] = flat["masks"][key]
+    for counter, coord in enumerate(parameters["radiators"].values(), start=1):
+        coord["mask_values"] = counter
+    # the flat's force_term numbers its radiators 1..n; HeatingModel numbers the building's 1..n*flats*floors
+    n_radiators, force_term = len(flat["radiators"]), flat["force_term"]
+    parameters["force_term"] = lambda x, t, mask: force_term(x, t, np.where(mask > 0, (mask - 1) % n_radiators + 1, 0))
+    parameters["domain"] = {
+        "grid": np.meshgrid(np.linspace(-1, 1, flats * width + 1), np.linspace(-1, 1, floors * height + 1))[0],
+        "dx": dx,
+        "shape": (floors * height, flats * width)
+    }
+
+    links = {}
+    rooms = list(parameters["rooms"].items())
+    for name, a in rooms:
+        for other, b in rooms:
+            # only walls on the seams between flats and floors; rooms of one flat stay as they were
+            if a["colmax"] == b["colmin"] and a["colmax"] % width == 0:
+                low, high = max(a["rowmin"], b["rowmin"]) + 1, min(a["rowmax"], b["rowmax"]) - 1
+                if low < high:
+                    links[f"{name}|{other}"] = {"rowmin": low, "rowmax": high, "colmin": a["colmax"] - 1,
+                                                "colmax": a["colmax"], "row_shift": 0, "col_shift": 1,
+                                                "weight": wall_transfer}
+            if a["rowmax"] == b["rowmin"] and a["rowmax"] % height == 0:
+                low, high = max(a["colmin"], b["colmin"]) + 1, min(a["colmax"], b["colmax"]) - 1
+                if low < high:
+                    links[f"{name}|{other}"] = {"rowmin": a["rowmax"] - 1, "rowmax": a["rowmax"], "colmin": low,
+                                                "colmax": high, "row_shift": 1, "col_shift": 0,
+                                                "weight": wall_transfer}
+    first, last = cell_span(stairs[0], stairs[1], dx, flats * width, 2)
+    middle = (first + last) // 2
+    for key in shared_rooms:
+        for floor in range(floors - 1):
+            coord = parameters["rooms"][f"F{floor}/{key}"]
+            low, high = (first, middle) if floor % 2 == 0 else (middle, last)
+            low, high = max(low, coord["colmin"] + 1), min(high, coord["colmax"] - 1)
+            if low < high:
+                links[f"F{floor}/{key}|F{floor + 1}/{key}"] = {
+                    "rowmin": coord["rowmin"] + 1, "rowmax": coord["rowmax"] - 1, "colmin": low, "colmax": high,
+                    "row_shift": height, "col_shift": 0, "weight": stair_transfer}
+    parameters["links"] = links
+    return parameters
+
+
+def band_parameters(parameters: dict, first_row: int, last_row: int):
+    # the part of a building between two floor boundaries, in its own coordinates and without links
+    local = {key: value for key, value in parameters.items() if key not in PARTS + ("links", "domain")}
+    for part in PARTS:
+        local[part] = {key: dict(coord, rowmin=coord["rowmin"] - first_row, rowmax=coord["rowmax"] - first_row)
+                       for key, coord in parameters[part].items()
+                       if first_row <= coord["rowmin"] and coord["rowmax"] <= last_row}
+    local["domain"] = dict(parameters["domain"], shape=(last_row - first_row, parameters["domain"]["shape"][1]))
+    return local
+
+
+def advance_band(arguments: tuple, options: dict, rows: tuple, memory_name: str, heating_name: str,
+                 number: int, n_steps: int, dt: float, start_time: float, barrier):
+    # worker: advances whole floors rows[0]:rows[1] of the shared grid, then exchanges heat over the links;
+    # links into the neighbouring bands read their cells from shared memory between two barriers
+    memory = shared_memory.SharedMemory(name=memory_name)
+    heating_memory = shared_memory.SharedMemory(name=heating_name)
+    try:
+        parameters = building_parameters(*arguments, **options)
+        shape = tuple(parameters["domain"]["shape"])
+        grid = np.ndarray(shape, buffer=memory.buf)
+        heating = np.ndarray((n_steps, barrier.parties), buffer=heating_memory.buf)
+        local = band_parameters(parameters, *rows)
+        geometry = compile_geometry(local, local["domain"]["shape"])
+        stencil = FusedStencil(geometry, radiators=Radiators(local, geometry))
+        index, partner, weight = compile_links(parameters, shape)
+        mine = (index >= rows[0] * shape[1]) & (index < rows[1] * shape[1])
+        index, partner, weight = index[mine], partner[mine], weight[mine]
+        exchange = np.empty(index.size)
+        flat, band = grid.reshape(-1), grid[rows[0]:rows[1]][np.newaxis]
+
+        window_temp = parameters["window_temp"]
+        coefficient = parameters["diffusion"] * dt / parameters["domain"]["dx"] ** 2
+        scale = parameters.get("force_dt", dt)
+        time = start_time
+        for step in range(n_steps):
+            heating[step, number] = stencil.advance(band, None, window_temp(time), geometry["setpoint"],
+                                                    coefficient, time, scale)[0]
+            barrier.wait()
+            np.subtract(flat[partner], flat[index], out=exchange)
+            exchange *= weight
+            barrier.wait()
+            flat[index] += exchange
+            time += dt
+    except BaseException:
+        barrier.abort()
+        raise
+    finally:
+        memory.close()
+        heating_memory.close()
+
+
+class BuildingModel:
+    # A block of flats (building_parameters) split into bands of whole floors, one per worker process.
+    # The temperature grid lives in shared memory; rooms never cross a band, so only the wall and stair
+    # links between floors need cells of another band. The same as
+    # HeatingModel(building_parameters(...), engine="fused"), up to the order of summing the energy.
+    def __init__(self, floors: int, flats: int, *args, workers: int = None, **kwargs):
+        self.arguments, self.options = (floors, flats) + args, kwargs
+        model = HeatingModel(building_parameters(floors, flats, *args, **kwargs))
+        if not Radiators.available(model.parameters):
+            raise ValueError("BuildingModel needs radiators with a power and radiator_amplitude")
+        self.parameters = model.parameters
+        floor_height = model.result_matrix.shape[0] // floors
+        bands = np.array_split(np.arange(floors), min(workers or os.cpu_count() or 1, floors))
+        self.bands = [(band[0] * floor_height, (band[-1] + 1) * floor_height) for band in bands]
+        self.memory = shared_memory.SharedMemory(create=True, size=model.result_matrix.nbytes)
+        self.result_matrix = np.ndarray(model.result_matrix.shape, buffer=self.memory.buf)
+        self.result_matrix[...] = model.result_matrix
+        self.steps = []
+        self.heatingData = []
+
+    def evolve(self, n_steps: int, dt: float):
+        context = multiprocessing.get_context()
+        barrier = context.Barrier(len(self.bands))
+        heating_memory = shared_memory.SharedMemory(create=True, size=max(1, n_steps * len(self.bands)) * 8)
+        try:
+            processes = [context.Process(target=advance_band,
+                                         args=(self.arguments, self.options, rows, self.memory.name,
+                                               heating_memory.name, number, n_steps, dt,
+                                               self.parameters["current_time"], barrier))
+                         for number, rows in enumerate(self.bands)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            if any(process.exitcode != 0 for process in processes):
+                raise RuntimeError("a building worker failed; the temperature grid is left mid-step")
+            heating = np.ndarray((n_steps, len(self.bands)), buffer=heating_memory.buf)
+            self.steps.extend(heating.sum(axis=1))
+        finally:
+            heating_memory.close()
+            heating_memory.unlink()
+        for _ in range(n_steps):
+            self.parameters["current_time"] += dt
+        self.heatingData = np.cumsum(self.steps)
+        return self
+
+    def close(self):
+        # keep a private copy of the temperatures and release the shared memory
+        self.result_matrix = self.result_matrix.copy()
+        self.memory.close()
+        self.memory.unlink()
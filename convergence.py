@@ -0,0 +1,51 @@
+import numpy as np
+
+
+class ConvergenceMonitor:
+    # Watches the run once per forcing period (window temperature repeats every 2*pi*3600/24 s) and asks
+    # HeatingModel.evolve to stop once room means and the energy used per period repeat within tolerance.
+    def __init__(self, period: float = 2 * np.pi * 3600 / 24, tolerance: float = 0.01,
+                 energy_tolerance: float = 0.01, cycles: int = 2):
+        self.period = period
+        self.tolerance = tolerance
+        self.energy_tolerance = energy_tolerance
+        self.cycles = cycles
+        self.steps_per_period = None
+        self.room_means = []
+        self.cycle_energy = []
+        self.repeats = 0
+        self.converged = False
+        self.converged_time = None
+        self.energy_per_cycle = None
+
+    def start(self, model, dt: float):
+        self.steps_per_period = max(1, int(round(self.period / dt)))
+        self.room_means, self.cycle_energy = [self.means(model)], []
+        self.repeats = 0
+        self.converged, self.converged_time, self.energy_per_cycle = False, None, None
+
+    def means(self, model):
+        return np.array([np.mean(model.result_matrix[coord["rowmin"]:coord["rowmax"],
+                                                     coord["colmin"]:coord["colmax"]])
+                         for coord in model.parameters["rooms"].values()])
+
+    def update(self, model, step: int):
+        # called after every step of evolve; returns True when the run may stop
+        if step % self.steps_per_period:
+            return False
+        self.room_means.append(self.means(model))
+        self.cycle_energy.append(float(np.sum(model.heatingData[-self.steps_per_period:])))
+        if len(self.cycle_energy) < 2:
+            return False
+        temperature_change = np.max(np.abs(self.room_means[-1] - self.room_means[-2]))
+        energy_change = abs(self.cycle_energy[-1] - self.cycle_energy[-2])
+        if temperature_change <= self.tolerance and \
+                energy_change <= self.energy_tolerance * max(abs(self.cycle_energy[-2]), 1e-12):
+            self.repeats += 1
+        else:
+            self.repeats = 0
+        if self.repeats >= self.cycles:
+            self.converged = True
+            self.converged_time = model.parameters["current_time"]
+            self.energy_per_cycle = self.cycle_energy[-1]
+        return self.converged
@@ -0,0 +1,113 @@
+import copy
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from stencil import compile_layout
+
+# Floor plans are given in plan units (the "j" of heatingmodel.pdf); with dx = 1 one unit is one grid cell.
+# Every rectangle spans [ymin, ymax) x [xmin, xmax). The apartment of the project is kept in apartment.json.
+PLAN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "apartment.json")
+PARTS = ("rooms", "radiators", "walls", "windows", "doors")
+# thinnest a feature may become on a coarse grid; windows and doors have to reach past the room boundary
+# into the first interior cell to have any effect
+MIN_CELLS = {"radiators": 1, "walls": 1, "windows": 2, "doors": 2}
+
+
+def validate_plan(plan: dict):
+    height, width = plan["size"]["height"], plan["size"]["width"]
+    for part in PARTS:
+        for key, box in plan.get(part, {}).items():
+            if not (0 <= box["ymin"] < box["ymax"] <= height and 0 <= box["xmin"] < box["xmax"] <= width):
+                raise ValueError(f"{key} must be a non-empty rectangle inside the {height} x {width} plan")
+    # rooms have to tile the plan: on the grid of all room edges every cell belongs to exactly one room
+    rooms = plan["rooms"]
+    ys = np.unique([0, height] + [box[side] for box in rooms.values() for side in ("ymin", "ymax")])
+    xs = np.unique([0, width] + [box[side] for box in rooms.values() for side in ("xmin", "xmax")])
+    owners = np.full((ys.size - 1, xs.size - 1), "", dtype=object)
+    for key, box in rooms.items():
+        block = np.s_[np.searchsorted(ys, box["ymin"]):np.searchsorted(ys, box["ymax"]),
+                      np.searchsorted(xs, box["xmin"]):np.searchsorted(xs, box["xmax"])]
+        taken = owners[block] != ""
+        if taken.any():
+            row, col = np.argwhere(taken)[0]
+            raise ValueError(f"rooms {owners[block][row, col]} and {key} overlap "
+                             f"at y={ys[block[0].start + row]}, x={xs[block[1].start + col]}")
+        owners[block] = key
+    if (owners == "").any():
+        row, col = np.argwhere(owners == "")[0]
+        raise ValueError(f"no room covers y={ys[row]}, x={xs[col]}")
+    for key, box in plan.get("radiators", {}).items():
+        if not any(area["ymin"] <= box["ymin"] and box["ymax"] <= area["ymax"] and
+                   area["xmin"] <= box["xmin"] and box["xmax"] <= area["xmax"] for area in rooms.values()):
+            raise ValueError(f"radiator {key} must lie inside a single room")
+    return plan
+
+
+def load_plan(path: str = PLAN_PATH):
+    with open(path, encoding="utf-8") as handle:
+        return validate_plan(json.load(handle))
+
+
+def cell_span(low: float, high: float, dx: float, limit: int, min_cells: int = 1):
+    first = int(np.floor(low / dx + 0.5))
+    last = int(np.floor(high / dx + 0.5))
+    if last - first < min_cells:
+        last = first + min_cells
+        if last > limit:
+            first, last = limit - min_cells, limit
+    return first, last
+
+
+def rasterise(plan: dict, dx: float = 1):
+    height = int(np.floor(plan["size"]["height"] / dx + 0.5))
+    width = int(np.floor(plan["size"]["width"] / dx + 0.5))
+    parameters = {}
+    for part in PARTS:
+        parameters[part] = {}
+        for key, box in plan.get(part, {}).items():
+            rowmin, rowmax = cell_span(box["ymin"], box["ymax"], dx, height, MIN_CELLS.get(part, 1))
+            colmin, colmax = cell_span(box["xmin"], box["xmax"], dx, width, MIN_CELLS.get(part, 1))
+            if part == "rooms" and (rowmax - rowmin < 3 or colmax - colmin < 3):
+                raise ValueError(f"room {key} is less than 3 cells across at dx={dx}; use a finer grid")
+            parameters[part][key] = {"rowmin": rowmin, "rowmax": rowmax, "colmin": colmin, "colmax": colmax}
+    for counter, key in enumerate(parameters["radiators"].keys(), start=1):
+        # a radiator against a wall may round onto the room boundary; keep it on the room's interior cells
+        box = plan["radiators"][key]
+        y, x = (box["ymin"] + box["ymax"]) / 2, (box["xmin"] + box["xmax"]) / 2
+        for room, area in plan["rooms"].items():
+            if area["ymin"] <= y < area["ymax"] and area["xmin"] <= x < area["xmax"]:
+                coord, room = parameters["radiators"][key], parameters["rooms"][room]
+                for low, high in (("rowmin", "rowmax"), ("colmin", "colmax")):
+                    size = coord[high] - coord[low]
+                    coord[low] = min(max(coord[low], room[low] + 1), room[high] - 1 - size)
+                    coord[high] = coord[low] + size
+                break
+        parameters["radiators"][key]["mask_values"] = counter
+        # the area in plan units; cells rounded to at least MIN_CELLS may cover more (or less) of the plan
+        parameters["radiators"][key]["area"] = (box["ymax"] - box["ymin"]) * (box["xmax"] - box["xmin"])
+    parameters["domain"] = {
+        "grid": np.meshgrid(np.linspace(-1, 1, width + 1), np.linspace(-1, 1, height + 1))[0],
+        "dx": dx,
+        "shape": (height, width)
+    }
+    return parameters
+
+
+_compiled = {}
+
+
+def compile_plan(path: str = PLAN_PATH, dx: float = 1):
+    # plan, rasterised rectangles and solver geometry, built once per process for each plan file content
+    # and dx; the rectangles are copied because model_parameters adds per-run settings to them
+    with open(path, "rb") as handle:
+        content = handle.read()
+    key = (hashlib.sha256(content).hexdigest(), float(dx))
+    if key not in _compiled:
+        plan = validate_plan(json.loads(content.decode("utf-8")))
+        parameters = rasterise(plan, dx)
+        _compiled[key] = (plan, parameters, compile_layout(parameters, parameters["domain"]["shape"]))
+    plan, parameters, geometry = _compiled[key]
+    return plan, copy.deepcopy(parameters), geometry
@@ -0,0 +1,134 @@
+import numpy as np
+
+from radiators import Radiators
+from stencil import room_means, average_doors, exchange_links
+
+FACTORS_KEPT = 8
+
+
+def factor_tridiagonal(lower, diagonal, upper):
+    # Thomas algorithm elimination done once, for many lines of equal length at a time (lines on axis 0)
+    upper_prime = np.zeros_like(diagonal)
+    pivot = np.empty_like(diagonal)
+    pivot[:, 0] = diagonal[:, 0]
+    upper_prime[:, 0] = upper[:, 0] / pivot[:, 0]
+    for j in range(1, diagonal.shape[1]):
+        pivot[:, j] = diagonal[:, j] - lower[:, j] * upper_prime[:, j - 1]
+        upper_prime[:, j] = upper[:, j] / pivot[:, j]
+    return lower, pivot, upper_prime
+
+
+def solve_tridiagonal(factors, rhs, out):
+    lower, pivot, upper_prime = factors
+    out[:, 0] = rhs[:, 0] / pivot[:, 0]
+    for j in range(1, rhs.shape[1]):
+        out[:, j] = (rhs[:, j] - lower[:, j] * out[:, j - 1]) / pivot[:, j]
+    for j in range(rhs.shape[1] - 2, -1, -1):
+        out[:, j] -= upper_prime[:, j] * out[:, j + 1]
+    return out
+
+
+class ADIIntegrator:
+    # Peaceman-Rachford ADI: implicit along rows, then along columns, unconditionally stable for any dt.
+    # Interior room cells are the unknowns; windows are held at window_temp (Dirichlet), plain room
+    # boundaries are zero-flux (Neumann) and door cells on a room boundary keep their current value.
+    def __init__(self, geometry: dict, parameters: dict, radiators: Radiators = None):
+        self.geometry = geometry
+        self.parameters = parameters
+        self.radiators = radiators
+        shape = tuple(geometry["shape"])
+        window = np.zeros(shape, dtype=bool)
+        window.flat[geometry["window_index"]] = True
+        door = np.zeros(shape, dtype=bool)
+        door.flat[geometry["door_index"]] = True
+        self.unknown = geometry["interior"] & ~window
+        in_room = geometry["room_label"] < geometry["room_size"].size
+        reflect = in_room & ~geometry["interior"] & ~window & ~door
+
+        # weight of the link from an unknown cell to each of its neighbours (0 across a Neumann wall)
+        coupled = ~reflect
+        self.weight = {}
+        for name, shift in (("up", (1, 0)), ("down", (-1, 0)), ("left", (0, 1)), ("right", (0, -1))):
+            self.weight[name] = (self.unknown & np.roll(coupled, shift, axis=(0, 1))).astype(float)
+        # the factorisations of the last few dt, most recent last (adaptive runs switch between a few)
+        self.factors = {}
+        self.rhs = np.empty(shape)
+        self.half = np.empty(shape)
+        self.source = np.zeros(shape)
+
+    def factorise(self, dt: float):
+        if dt in self.factors:
+            self.factors[dt] = self.factors.pop(dt)
+        else:
+            if len(self.factors) >= FACTORS_KEPT:
+                del self.factors[next(iter(self.factors))]
+            ratio = self.parameters["diffusion"] * dt / self.parameters["domain"]["dx"] ** 2 / 2
+            w = self.weight
+            rows = factor_tridiagonal(-ratio * w["left"], 1 + ratio * (w["left"] + w["right"]),
+                                      -ratio * w["right"])
+            columns = factor_tridiagonal(-ratio * w["up"].T, 1 + ratio * (w["up"] + w["down"]).T,
+                                         -ratio * w["down"].T)
+            self.factors[dt] = (ratio, rows, columns)
+        return self.factors[dt]
+
+    def explicit_half(self, temperature, ratio: float, first: str, second: str, axis: int, out):
+        # out = T + ratio * (w_first * (T_first - T) + w_second * (T_second - T)) along one axis
+        w = self.weight
+        np.subtract(np.roll(temperature, 1, axis=axis), temperature, out=out)
+        out *= w[first]
+        out += w[second] * (np.roll(temperature, -1, axis=axis) - temperature)
+        out *= ratio
+        out += temperature
+        return out
+
+    def step(self, model, dt: float, rate: bool = True):
+        # sources are always a rate here, scaled with dt
+        g = self.geometry
+        parameters = self.parameters
+        temperature = model.result_matrix
+        # force and window temperature are sampled at the middle of the (possibly long) step
+        midpoint = parameters["current_time"] + dt / 2
+        profiler = model.profiler
+        temperature.flat[g["window_index"]] = parameters["window_temp"](midpoint)
+        profiler.lap("windows")
+        flat = temperature.reshape(1, -1)
+        hot = room_means(flat, g, g["room_label"].ravel())[0] > g["setpoint"]
+        self.hot = hot[np.newaxis]
+        profiler.lap("thermostat")
+
+        if self.radiators is not None:
+            # radiator cells are interior, so only they need refreshing in the source grid
+            source = self.source
+            self.radiators.emit(midpoint, hot[np.newaxis], dt)
+            source.flat[self.radiators.cell_index] = self.radiators.cell_values()[0] / 2
+            heating = self.radiators.heating()[0]
+        else:
+            force_term_full = np.array(parameters["force_term"](parameters["domain"]["grid"], midpoint,
+                                                                model.mask_matrix), dtype=float)
+            force_term_full *= model.source_scale * (dt / parameters.get("force_dt", dt))
+            if hot.any():
+                force_term_full.flat[g["interior_index"][hot[g["interior_room"]]]] = 0
+            source = np.where(self.unknown, force_term_full / 2, 0)
+            heating = np.sum(force_term_full) * parameters["domain"]["dx"] ** 2
+        profiler.lap("force_term")
+
+        ratio, rows, columns = self.factorise(dt)
+        rhs, half = self.rhs, self.half
+        self.explicit_half(temperature, ratio, "up", "down", 0, rhs)
+        rhs += source
+        solve_tridiagonal(rows, rhs, half)
+        profiler.lap("row_sweep")
+        self.explicit_half(half, ratio, "left", "right", 1, rhs)
+        rhs += source
+        solve_tridiagonal(columns, rhs.T.copy(), temperature.T)
+        profiler.lap("column_sweep")
+
+        flat[:, g["neumann_index"]] = flat[:, g["neumann_source"]]
+        profiler.lap("neumann")
+        if g["door_index"].size:
+            average_doors(flat, g, g["door_label"])
+        profiler.lap("doors")
+        if g["link_index"].size:
+            exchange_links(flat, g)
+            profiler.lap("links")
+        return heating
@@ -0,0 +1,121 @@
+import importlib.util
+
+import numpy as np
+
+from radiators import Radiators
+from stencil import FusedStencil, exchange_links
+from profiling import NO_PROFILER
+
+HAVE_NUMBA = importlib.util.find_spec("numba") is not None
+prange = range
+_kernels = {}
+
+
+def _thermostat(flat, window_index, window_temp, room_label, room_size, setpoint, room_sum, hot):
+    for k in range(window_index.size):
+        flat[window_index[k]] = window_temp
+    room_sum[:] = 0
+    for c in range(flat.size):
+        room_sum[room_label[c]] += flat[c]
+    for room in range(hot.size):
+        hot[room] = room_sum[room] / room_size[room] > setpoint[room]
+
+
+def _stencil(temperature, interior, room_label, hot, force, source_index, source_value, coefficient, new,
+             neumann_index, neumann_source, door_index, door_label, door_size, door_sum):
+    # one pass over the rows computes the new interior (threaded when compiled with parallel=True),
+    # a second one writes it back; Neumann copies and door averages work on the updated field
+    height, width = temperature.shape
+    with_force = force.shape[0] == height
+    for i in prange(1, height - 1):
+        for j in range(1, width - 1):
+            if interior[i, j]:
+                value = temperature[i - 1, j] + temperature[i + 1, j]
+                value += temperature[i, j - 1]
+                value += temperature[i, j + 1]
+                value -= 4 * temperature[i, j]
+                value *= coefficient
+                if with_force and not hot[room_label[i, j]]:
+                    value += force[i, j]
+                new[i, j] = value
+    for k in range(source_index.size):
+        new[source_index[k] // width, source_index[k] % width] += source_value[k]
+    for i in prange(1, height - 1):
+        for j in range(1, width - 1):
+            if interior[i, j]:
+                temperature[i, j] += new[i, j]
+
+    flat = temperature.reshape(-1)
+    for k in range(neumann_index.size):
+        flat[neumann_index[k]] = flat[neumann_source[k]]
+    door_sum[:] = 0
+    for k in range(door_index.size):
+        door_sum[door_label[k]] += flat[door_index[k]]
+    for k in range(door_index.size):
+        flat[door_index[k]] = door_sum[door_label[k]] / door_size[door_label[k]]
+
+    heating = 0.0
+    if with_force:
+        for i in range(height):
+            for j in range(width):
+                if not (interior[i, j] and hot[room_label[i, j]]):
+                    heating += force[i, j]
+    return heating
+
+
+def kernels():
+    # numba is imported (which takes a while) the first time the jit engine is used, not with this module
+    global prange
+    if not _kernels:
+        from numba import njit, prange
+        _kernels.update(thermostat=njit(cache=True)(_thermostat), serial=njit(cache=True)(_stencil),
+                        parallel=njit(cache=True, parallel=True)(_stencil))
+    return _kernels
+
+
+class JitStencil(FusedStencil):
+    # the same scheme as FusedStencil, with windows, thermostat, stencil, Neumann boundary and doors
+    # compiled by numba into two kernels that allocate nothing per step
+    def __init__(self, geometry: dict, batch: int = 1, radiators: Radiators = None, parallel: bool = False):
+        if not HAVE_NUMBA:
+            raise ImportError("the jit engine needs numba")
+        super().__init__(geometry, batch, radiators)
+        self.thermostat = kernels()["thermostat"]
+        self.kernel = kernels()["parallel" if parallel else "serial"]
+        g = geometry
+        n_rooms = g["room_size"].size
+        self.flat_label = np.ascontiguousarray(g["room_label"].ravel())
+        self.room_sum = np.zeros(n_rooms + 1)
+        self.hot = np.zeros((batch, n_rooms), dtype=bool)
+        self.new = np.zeros(tuple(g["shape"]))
+        self.door_sum = np.zeros(g["door_size"].size)
+        self.no_force = np.zeros((0, 0))
+        self.no_source = (np.zeros(0, dtype=np.intp), np.zeros(0))
+
+    def advance(self, temperature, force, window_temp, setpoint, coefficient: float,
+                time: float = 0.0, scale: float = 1.0, profiler=NO_PROFILER):
+        g = self.geometry
+        window_temp = np.broadcast_to(np.asarray(window_temp, dtype=float), (self.batch,))
+        setpoint = np.broadcast_to(setpoint, self.hot.shape)
+        for b in range(self.batch):
+            self.thermostat(temperature[b].reshape(-1), g["window_index"], window_temp[b], self.flat_label,
+                            g["room_size"], setpoint[b], self.room_sum, self.hot[b])
+        profiler.lap("thermostat")
+        if force is None:
+            self.radiators.emit(time, self.hot, scale)
+            values = self.radiators.cell_values()
+        profiler.lap("sources")
+        heating = np.empty(self.batch)
+        for b in range(self.batch):
+            source_index, source_value = (self.radiators.cell_index, values[b]) if force is None else self.no_source
+            heating[b] = self.kernel(temperature[b], g["interior"], g["room_label"], self.hot[b],
+                                     self.no_force if force is None else force[b], source_index, source_value,
+                                     coefficient, self.new, g["neumann_index"], g["neumann_source"],
+                                     g["door_index"], g["door_label"], g["door_size"], self.door_sum)
+        profiler.lap("stencil")
+        if g["link_index"].size:
+            exchange_links(temperature.reshape(self.batch, -1), g)
+            profiler.lap("links")
+        if force is None:
+            return self.radiators.heating()
+        return heating
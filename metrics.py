@@ -0,0 +1,89 @@
+import numpy as np
+
+
+class MetricsAccumulator:
+    # Energy and comfort numbers gathered while HeatingModel.evolve runs, in arrays allocated up front.
+    # Radiator energy is summed every step (needs an engine with radiator sources, see radiators.py);
+    # room mean/min/max temperatures are sampled every `every` steps and degree-minutes below each
+    # room's setpoint (or below `target`, a temperature or one per room) are integrated from those samples.
+    # Window cells are left out of these: they are held at the outdoor temperature.
+    def __init__(self, every: int = 1, target=None):
+        self.every = every
+        self.target = target
+        self.count = 0
+
+    def start(self, model, dt: float, n_steps: int):
+        rooms = model.parameters["rooms"]
+        self.rooms = list(rooms.keys())
+        self.setpoint = np.array([rooms[room]["temp"] for room in self.rooms], dtype=float)
+        if self.target is not None:
+            self.setpoint = np.broadcast_to(np.asarray(self.target, dtype=float), self.setpoint.shape)
+        # room by room, as the sparse engines keep their cells; theirs are read from their compact array
+        self.compact = hasattr(model.stencil, "values")
+        if self.compact:
+            label = model.stencil.label.copy()
+            label[model.stencil.geometry["window"]] = len(self.rooms)
+        else:
+            label = np.full(model.result_matrix.shape, len(self.rooms), dtype=np.intp)
+            for number, coord in enumerate(rooms.values()):
+                label[coord["rowmin"]:coord["rowmax"], coord["colmin"]:coord["colmax"]] = number
+            for coord in model.parameters["windows"].values():
+                label[coord["rowmin"]:coord["rowmax"], coord["colmin"]:coord["colmax"]] = len(self.rooms)
+            label = label.ravel()
+        self.order = np.argsort(label, kind="stable")
+        self.order = self.order[label[self.order] < len(self.rooms)]
+        sizes = np.bincount(label, minlength=len(self.rooms) + 1)[:len(self.rooms)]
+        self.size = sizes.astype(float)
+        self.starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+        self.radiators = getattr(model.stencil, "radiators", None)
+        n_samples = n_steps // self.every + 1
+        self.time = np.full(n_samples, np.nan)
+        self.room_mean = np.full((n_samples, len(self.rooms)), np.nan)
+        self.room_min = np.full((n_samples, len(self.rooms)), np.nan)
+        self.room_max = np.full((n_samples, len(self.rooms)), np.nan)
+        self.degree_minutes = np.zeros(len(self.rooms))
+        if self.radiators is not None:
+            self.radiator_names = self.radiators.names
+            self.radiator_energy = np.zeros(len(self.radiator_names))
+            self.radiator_energy_samples = np.full((n_samples, len(self.radiator_names)), np.nan)
+        else:
+            self.radiator_names, self.radiator_energy, self.radiator_energy_samples = [], None, None
+        self.count = 0
+        self.sample(model, dt)
+
+    def sample(self, model, dt: float):
+        values = (model.stencil.values if self.compact else model.result_matrix.ravel())[self.order]
+        mean = np.add.reduceat(values, self.starts) / self.size
+        self.time[self.count] = model.parameters["current_time"]
+        self.room_mean[self.count] = mean
+        self.room_min[self.count] = np.minimum.reduceat(values, self.starts)
+        self.room_max[self.count] = np.maximum.reduceat(values, self.starts)
+        if self.count:
+            self.degree_minutes += np.maximum(self.setpoint - mean, 0) * self.every * dt / 60
+        if self.radiators is not None:
+            self.radiator_energy_samples[self.count] = self.radiator_energy
+        self.count += 1
+
+    def update(self, model, step: int, dt: float):
+        if self.radiators is not None:
+            self.radiator_energy += self.radiators.emitted[0] * self.radiators.area
+        if step % self.every == 0:
+            self.sample(model, dt)
+
+    def finish(self):
+        # drop samples that were never reached (a monitor may have stopped the run early)
+        for name in ("time", "room_mean", "room_min", "room_max", "radiator_energy_samples"):
+            if getattr(self, name) is not None:
+                setattr(self, name, getattr(self, name)[:self.count])
+        return self
+
+    def summary(self):
+        result = {}
+        for number, room in enumerate(self.rooms):
+            result[f"degree_minutes_{room}"] = float(self.degree_minutes[number])
+            result[f"min_{room}"] = float(np.min(self.room_min[:self.count, number]))
+        for number, name in enumerate(self.radiator_names):
+            result[f"energy_{name}"] = float(self.radiator_energy[number])
+        result["degree_minutes"] = float(np.sum(self.degree_minutes))
+        return result
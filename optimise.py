@@ -0,0 +1,100 @@
+from dataclasses import replace
+
+import numpy as np
+
+from sweep import Scenario, SCENARIO_FIELDS, sweep
+
+# radiator heaters have settings 0..4 (heatingmodel.pdf); the model itself accepts any value in between
+POWER_BOUNDS = {"k1": (0, 4), "k2": (0, 4), "k3": (0, 4), "k4": (0, 4)}
+
+
+def latin_hypercube(n: int, dimensions: int, rng):
+    # one point in each of n strata along every axis, in the unit cube
+    return (np.argsort(rng.random((dimensions, n)), axis=1).T + rng.random((n, dimensions))) / n
+
+
+def quadratic_features(unit):
+    columns = [np.ones(len(unit))] + [unit[:, i] for i in range(unit.shape[1])]
+    columns += [unit[:, i] * unit[:, j] for i in range(unit.shape[1]) for j in range(i, unit.shape[1])]
+    return np.column_stack(columns)
+
+
+def fit_surrogate(unit, values, ridge: float = 1e-6):
+    features = quadratic_features(unit)
+    coefficients = np.linalg.solve(features.T @ features + ridge * np.eye(features.shape[1]), features.T @ values)
+    return lambda points: quadratic_features(points) @ coefficients
+
+
+def optimise(n_steps: int, dt: float, bounds: dict = POWER_BOUNDS, max_degree_minutes: float = 10.0,
+             base: Scenario = Scenario(0, 0, 0, 0), iterations: int = 8, batch: int = 4, initial: int = None,
+             processes: int = None, results_path: str = None, comfort_target=None, engine: str = "fused",
+             candidates: int = 4000, seed: int = 0):
+    # Minimise the heating energy of a run over the variables in `bounds` (any Scenario fields, e.g. powers
+    # k1..k4 and setpoints s1..s5) while the degree-minutes below the comfort target stay under the limit.
+    # Quadratic surrogates of energy and degree-minutes are fitted to all runs so far, the most promising
+    # points of a shrinking trust region around the best run are simulated in parallel, and so on.
+    # When setpoints are optimised, give comfort_target, otherwise lowering a setpoint also lowers the bar.
+    rng = np.random.default_rng(seed)
+    names = list(bounds.keys())
+    low = np.array([bounds[name][0] for name in names], dtype=float)
+    high = np.array([bounds[name][1] for name in names], dtype=float)
+    initial = initial or (len(names) + 1) * (len(names) + 2) // 2 + 1
+
+    evaluated, history = {}, []
+
+    def evaluate(unit_points):
+        scenarios = [replace(base, **dict(zip(names, low + point * (high - low)))) for point in unit_points]
+        rows = sweep(scenarios, n_steps, dt, results_path, processes, engine=engine, comfort_target=comfort_target)
+        wanted = {(scenario.key(), float(n_steps), float(dt)) for scenario in scenarios}
+        for row in rows:
+            key = (tuple(float(row[name]) for name in SCENARIO_FIELDS), float(row["n_steps"]), float(row["dt"]))
+            if key in wanted and key not in evaluated:
+                evaluated[key] = row
+                history.append(row)
+
+    def best_run():
+        unit = np.array([[(row[name] - low[i]) / (high[i] - low[i]) for i, name in enumerate(names)]
+                         for row in history])
+        energy = np.array([row["energy"] for row in history])
+        comfort = np.array([row["degree_minutes"] for row in history])
+        feasible = comfort <= max_degree_minutes
+        best = np.argmin(np.where(feasible, energy, np.inf)) if feasible.any() else np.argmin(comfort)
+        return unit, energy, comfort, best
+
+    evaluate(latin_hypercube(initial, len(names), rng))
+    radius = 0.5
+    unit, energy, comfort, best = best_run()
+    for _ in range(iterations):
+        predict_energy, predict_comfort = fit_surrogate(unit, energy), fit_surrogate(unit, comfort)
+        centre = unit[best]
+        points = np.clip(centre + radius * (2 * rng.random((candidates, len(names))) - 1), 0, 1)
+        expected_energy, expected_comfort = predict_energy(points), predict_comfort(points)
+        feasible = expected_comfort <= max_degree_minutes
+        score = np.where(feasible, expected_energy, np.inf) if feasible.any() else expected_comfort
+        chosen = []
+        for index in np.argsort(score):
+            # keep the batch spread out, and away from runs already made
+            if all(np.max(np.abs(points[index] - other)) > radius / 10 for other in chosen + list(unit)):
+                chosen.append(points[index])
+            if len(chosen) == batch:
+                break
+        if not chosen:
+            radius /= 2
+            continue
+        previous = (comfort[best] <= max_degree_minutes, energy[best] if comfort[best] <= max_degree_minutes
+                    else comfort[best])
+        evaluate(np.array(chosen))
+        unit, energy, comfort, best = best_run()
+        current = (comfort[best] <= max_degree_minutes, energy[best] if comfort[best] <= max_degree_minutes
+                   else comfort[best])
+        improved = current[0] > previous[0] or (current[0] == previous[0] and current[1] < previous[1])
+        radius = min(1.0, radius * 1.5) if improved else radius / 2
+
+    return {"best": history[best], "feasible": bool(comfort[best] <= max_degree_minutes),
+            "evaluations": len(history), "history": history}
+
+
+if __name__ == "__main__":
+    result = optimise(10000, 0.1)
+    print(f"{result['evaluations']} simulations, feasible: {result['feasible']}")
+    print({name: round(result["best"][name], 2) for name in ("k1", "k2", "k3", "k4", "energy", "degree_minutes")})
@@ -0,0 +1,106 @@
+import json
+import time
+import tracemalloc
+from collections import defaultdict
+
+
+class NullProfiler:
+    def start(self):
+        pass
+
+    def lap(self, phase: str):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+NO_PROFILER = NullProfiler()
+
+
+class StepProfiler:
+    # Wall time per phase of a time step: start() at the beginning of a step, lap(phase) after each
+    # phase, stop() at the end. With allocations=True tracemalloc also records, per phase, the peak
+    # of memory allocated above what was live when the phase began (numpy temporaries show up here).
+    def __init__(self, allocations: bool = False):
+        self.allocations = allocations
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.peak_bytes = defaultdict(int)
+        self.steps = 0
+        self.step_seconds = 0.0
+        self.started_tracing = False
+        self.step_start = self.last = None
+        self.live = 0
+
+    def start(self):
+        if self.allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracing = True
+            self.live = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.step_start = self.last = time.perf_counter()
+
+    def lap(self, phase: str):
+        now = time.perf_counter()
+        self.seconds[phase] += now - self.last
+        self.calls[phase] += 1
+        if self.allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak_bytes[phase] += peak - self.live
+            self.live = current
+            tracemalloc.reset_peak()
+        self.last = time.perf_counter()
+
+    def stop(self):
+        now = time.perf_counter()
+        self.steps += 1
+        self.step_seconds += now - self.step_start
+
+    def close(self):
+        # HeatingModel.evolve calls this at the end of a run; a later run traces again from its first step
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def report(self):
+        phases = {}
+        for phase, seconds in self.seconds.items():
+            phases[phase] = {
+                "seconds": seconds,
+                "calls": self.calls[phase],
+                "mean_us": 1e6 * seconds / self.calls[phase],
+                "share": seconds / self.step_seconds if self.step_seconds else 0.0,
+            }
+            if self.allocations:
+                phases[phase]["peak_bytes_per_call"] = self.peak_bytes[phase] / self.calls[phase]
+        return {
+            "steps": self.steps,
+            "step_seconds": self.step_seconds,
+            "steps_per_second": self.steps / self.step_seconds if self.step_seconds else 0.0,
+            "allocations": self.allocations,
+            "phases": phases,
+        }
+
+    def save(self, path: str, **extra):
+        report = self.report()
+        report.update(extra)
+        with open(path, "w") as handle:
+            json.dump(report, handle, indent=2)
+        return report
+
+
+def regressions(baseline: dict, report: dict, threshold: float = 0.1):
+    # phases (and the whole step) whose mean time grew by more than `threshold` against the baseline
+    slower = {}
+    if report["steps_per_second"] < baseline["steps_per_second"] * (1 - threshold):
+        slower["step"] = baseline["steps_per_second"] / report["steps_per_second"] - 1
+    for phase, numbers in report["phases"].items():
+        before = baseline["phases"].get(phase)
+        if before and numbers["mean_us"] > before["mean_us"] * (1 + threshold):
+            slower[phase] = numbers["mean_us"] / before["mean_us"] - 1
+    return slower
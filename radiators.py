@@ -0,0 +1,71 @@
+import numpy as np
+
+
+class Radiators:
+    # radiator r emits (radiator_amplitude(t) + power_r) per unit time in each of its cells,
+    # unless the thermostat of the room it stands in has cut it off
+    def __init__(self, parameters: dict, geometry: dict, powers=None):
+        shape = tuple(geometry["shape"])
+        self.names = list(parameters["radiators"].keys())
+        self.amplitude = parameters["radiator_amplitude"]
+        cell_index, cell_owner, room = [], [], []
+        for number, name in enumerate(self.names):
+            coord = parameters["radiators"][name]
+            cells = np.ravel_multi_index(np.mgrid[coord["rowmin"]:coord["rowmax"],
+                                                  coord["colmin"]:coord["colmax"]].reshape(2, -1), shape)
+            # found from the room rectangles, so that layouts without full-grid arrays (sparse.py) work too
+            owner_room = [label for label, box in enumerate(parameters["rooms"].values())
+                          if box["rowmin"] < coord["rowmin"] and coord["rowmax"] < box["rowmax"] and
+                          box["colmin"] < coord["colmin"] and coord["colmax"] < box["colmax"]]
+            if not owner_room:
+                raise ValueError(f"radiator {name} must lie inside a room")
+            cell_index.append(cells)
+            cell_owner.append(np.full(cells.size, number, dtype=np.intp))
+            room.append(owner_room[0])
+        self.cell_index = np.concatenate(cell_index)
+        self.cell_owner = np.concatenate(cell_owner)
+        self.cell_count = np.bincount(self.cell_owner, minlength=len(self.names)).astype(float)
+        # a radiator covers its plan area whatever cells it was rounded onto, so heat input and energy do
+        # not depend on the grid resolution; every cell emits area / (cells * dx^2) times the power density
+        self.area = np.array([parameters["radiators"][name].get("area", np.nan) for name in self.names])
+        cell_area = self.cell_count * geometry["dx"] ** 2
+        self.area = np.where(np.isnan(self.area), cell_area, self.area)
+        self.cell_scale = (self.area / cell_area)[self.cell_owner]
+        self.room = np.array(room, dtype=np.intp)
+        row, col = np.unravel_index(self.cell_index, shape)
+        # position of each radiator cell inside the grid without its outer ring, as used by the stencil
+        self.inner_index = (row - 1) * (shape[1] - 2) + (col - 1)
+        if powers is None:
+            powers = [parameters["radiators"][name]["power"] for name in self.names]
+        self.power = np.atleast_2d(np.array(powers, dtype=float))
+        self.emitted = np.zeros_like(self.power)
+
+    @staticmethod
+    def available(parameters: dict):
+        return "radiator_amplitude" in parameters and \
+            all("power" in radiator for radiator in parameters["radiators"].values())
+
+    def emit(self, time: float, hot, scale: float):
+        # hot is (batch, rooms); returns what every radiator adds to each of its cells in this step
+        np.add(self.power, self.amplitude(time), out=self.emitted)
+        self.emitted *= scale
+        self.emitted[hot[:, self.room]] = 0
+        return self.emitted
+
+    def cell_values(self):
+        return self.emitted[:, self.cell_owner] * self.cell_scale
+
+    def heating(self):
+        return self.emitted @ self.area
+
+
+def source_scale(parameters: dict, shape: tuple):
+    # the same per-cell factor for engines driven by force_term: area / (cells * dx^2) on every radiator
+    # that has a plan area, 1 everywhere else
+    scale = np.ones(shape)
+    dx = parameters["domain"]["dx"]
+    for coord in parameters["radiators"].values():
+        if "area" in coord:
+            block = np.s_[coord["rowmin"]:coord["rowmax"], coord["colmin"]:coord["colmax"]]
+            scale[block] = coord["area"] / (scale[block].size * dx ** 2)
+    return scale
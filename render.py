@@ -0,0 +1,185 @@
+import queue
+import threading
+
+import numpy as np
+
+from snapshots import load_snapshots
+
+VIDEO = (".mp4", ".avi", ".mkv", ".mov", ".webm")
+
+
+class FrameRenderer:
+    # Draws temperature frames on one figure built at the first frame: every later frame only swaps the
+    # image data (set_data) and the title and redraws those two over the saved rest of the figure (axes,
+    # colour bar). The figure is rendered off-screen with Agg, so no display or pyplot is needed.
+    # path picks the output: .gif (Pillow, written at close), a video file (ffmpeg, streamed frame by frame)
+    # or .png with "{index}" (and optionally "{time}") in the name, one file per frame or, with
+    # tiles=(rows, cols), one sheet of rows*cols frames per file. vmin/vmax fix the colour scale; by default
+    # it is taken from the first frame.
+    def __init__(self, path: str, fps: int = 10, vmin: float = None, vmax: float = None, cmap: str = "coolwarm",
+                 celsius: bool = True, title: str = "t = {time:.0f} s", dpi: int = 100, tiles: tuple = None,
+                 start: int = 0):
+        self.path, self.fps, self.dpi, self.tiles = path, fps, dpi, tiles
+        self.kind = path.lower().rsplit(".", 1)[-1]
+        if "." + self.kind in VIDEO:
+            self.kind = "video"
+        if self.kind not in ("gif", "png", "video"):
+            raise ValueError(f"cannot write {path!r}; use .gif, .png or one of {', '.join(VIDEO)}")
+        if self.kind == "png" and "{index" not in path:
+            raise ValueError("a .png path needs an {index} field, e.g. 'frames/t{index:04d}.png'")
+        if tiles is not None and self.kind != "png":
+            raise ValueError("tiles are only written as .png sheets")
+        self.vmin, self.vmax, self.cmap, self.celsius, self.title_format = vmin, vmax, cmap, celsius, title
+        self.index = start
+        self.figure = None
+        self.gif, self.sheet, self.sheet_times, self.video = [], [], [], None
+
+    def build(self, frame):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        self.figure = Figure(dpi=self.dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        axes = self.figure.add_subplot()
+        self.image = axes.imshow(frame, cmap=self.cmap,
+                                 vmin=frame.min() if self.vmin is None else self.vmin,
+                                 vmax=frame.max() if self.vmax is None else self.vmax)
+        colorbar = self.figure.colorbar(self.image, ax=axes)
+        colorbar.set_label("Temperature [C]" if self.celsius else "Temperature [K]")
+        self.title = axes.set_title("")
+        self.image.set_visible(False)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.image.set_visible(True)
+        if self.kind == "video":
+            from matplotlib.animation import FFMpegWriter
+
+            if not FFMpegWriter.isAvailable():
+                raise RuntimeError("writing video needs ffmpeg on PATH; use a .gif or .png path instead")
+            self.video = FFMpegWriter(fps=self.fps)
+            self.video.setup(self.figure, self.path, self.dpi)
+
+    def write(self, frame, time: float):
+        frame = np.asarray(frame) - (273 if self.celsius else 0)
+        if self.figure is None:
+            self.build(frame)
+        self.image.set_data(frame)
+        self.title.set_text(self.title_format.format(time=time))
+        if self.video is not None:
+            self.video.grab_frame()
+        else:
+            axes = self.image.axes
+            self.canvas.restore_region(self.background)
+            axes.draw_artist(self.image)
+            for spine in axes.spines.values():
+                axes.draw_artist(spine)
+            axes.draw_artist(self.title)
+            rgb = np.asarray(self.canvas.buffer_rgba())[..., :3]
+            if self.kind == "gif":
+                from PIL import Image
+
+                # a palette image is a quarter of the RGBA buffer, and what the GIF stores anyway; the first
+                # frame shows the whole colour bar, so its palette serves every later frame
+                if self.gif:
+                    self.gif.append(Image.fromarray(rgb).quantize(palette=self.gif[0], dither=Image.Dither.NONE))
+                else:
+                    self.gif.append(Image.fromarray(rgb).quantize(method=Image.Quantize.FASTOCTREE))
+            elif self.tiles is None:
+                self.save_png(rgb, time)
+            else:
+                self.sheet.append(rgb.copy())
+                self.sheet_times.append(time)
+                if len(self.sheet) == self.tiles[0] * self.tiles[1]:
+                    self.save_sheet()
+        return self
+
+    def save_png(self, rgb, time: float):
+        from PIL import Image
+
+        Image.fromarray(rgb).save(self.path.format(index=self.index, time=time))
+        self.index += 1
+
+    def save_sheet(self):
+        rows, cols = self.tiles
+        height, width, _ = self.sheet[0].shape
+        sheet = np.full((rows * height, cols * width, 3), 255, dtype=np.uint8)
+        for number, rgb in enumerate(self.sheet):
+            row, col = divmod(number, cols)
+            sheet[row * height:(row + 1) * height, col * width:(col + 1) * width] = rgb
+        self.save_png(sheet, self.sheet_times[0])
+        self.sheet, self.sheet_times = [], []
+
+    def close(self):
+        if self.video is not None:
+            self.video.finish()
+            self.video = None
+        if self.gif:
+            self.gif[0].save(self.path, save_all=True, append_images=self.gif[1:], duration=1000 / self.fps, loop=0)
+            self.gif = []
+        if self.sheet:
+            self.save_sheet()
+        return self.path
+
+
+def render_frames(frames, times, path: str, **options):
+    # frames and times: any iterables (a list, a generator, snapshots straight from a model)
+    renderer = FrameRenderer(path, **options)
+    for frame, time in zip(frames, times):
+        renderer.write(frame, time)
+    return renderer.close()
+
+
+def render_snapshots(snapshot_path: str, path: str, every: int = 1, **options):
+    # from the frame store of evolve(..., snapshot_path=...): frames are read from disk one at a time; the
+    # colour scale spans the frames actually written unless vmin/vmax are given (one pass over the file,
+    # far cheaper than drawing)
+    frames, times = load_snapshots(snapshot_path)
+    if not times.size:
+        raise ValueError(f"{snapshot_path} holds no frames")
+    frames, times = frames[::every], times[::every]
+    offset = 273 if options.get("celsius", True) else 0
+    if options.get("vmin") is None:
+        options["vmin"] = min(float(frame.min()) for frame in frames) - offset
+    if options.get("vmax") is None:
+        options["vmax"] = max(float(frame.max()) for frame in frames) - offset
+    return render_frames(frames, times, path, **options)
+
+
+class FrameStream:
+    # evolve(..., frames=FrameStream(FrameRenderer(...), every=...)): every `every` steps a copy of the grid
+    # is queued and drawn by a background thread while the simulation goes on. The queue is bounded, so a
+    # renderer slower than the simulation holds it back instead of piling up frames in memory.
+    def __init__(self, renderer: FrameRenderer, every: int = 1, maxsize: int = 16):
+        self.renderer = renderer
+        self.every = every
+        self.queue = queue.Queue(maxsize)
+        self.thread = None
+        self.error = None
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is None:
+                try:
+                    self.renderer.write(*item)
+                except BaseException as error:
+                    # keep taking frames so the simulation is not blocked; the error is raised in finish()
+                    self.error = error
+
+    def start(self, model, dt: float, n_steps: int):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.queue.put((model.result_matrix.copy(), model.parameters["current_time"]))
+
+    def update(self, model, step: int, dt: float):
+        if step % self.every == 0:
+            self.queue.put((model.result_matrix.copy(), model.parameters["current_time"]))
+
+    def finish(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.renderer.close()
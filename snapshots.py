@@ -0,0 +1,41 @@
+import numpy as np
+
+
+class SnapshotWriter:
+    # Frames go straight into a memory-mapped .npy file (or an in-memory array when no path is given);
+    # the simulation times of the frames are written next to it as <name>_times.npy. The file is sized for
+    # the whole schedule; a run that stops early leaves the rest unwritten, and only the times of the
+    # frames written are saved
+    def __init__(self, shape: tuple, n_frames: int, path: str = None, dtype=np.float64, flush_every: int = 16):
+        self.path = path
+        self.flush_every = flush_every
+        if path is None:
+            self.frames = np.empty((n_frames,) + tuple(shape), dtype=dtype)
+        else:
+            self.frames = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(n_frames,) + tuple(shape))
+        self.times = np.full(n_frames, np.nan)
+        self.count = 0
+
+    def write(self, frame, time: float):
+        self.frames[self.count] = frame
+        self.times[self.count] = time
+        self.count += 1
+        if self.path is not None and self.count % self.flush_every == 0:
+            self.frames.flush()
+
+    def close(self):
+        if self.path is not None:
+            self.frames.flush()
+            np.save(times_path(self.path), self.times[:self.count])
+
+
+def times_path(path: str):
+    return path[:-4] + "_times.npy" if path.endswith(".npy") else path + "_times.npy"
+
+
+def load_snapshots(path: str):
+    # frames stay on disk; only the pages that are read get loaded. Frames past the last written one are
+    # left out (files from before the count was saved mark them with a NaN time)
+    times = np.load(times_path(path))
+    times = times[:np.isfinite(times).sum()]
+    return np.load(path, mmap_mode="r")[:times.size], times
@@ -0,0 +1,190 @@
+import numpy as np
+
+from radiators import Radiators
+from stencil import average_doors, compile_links, exchange_links
+from profiling import NO_PROFILER
+
+
+def compile_sparse_layout(parameters: dict, shape: tuple):
+    # The layout of SparseStencil, built room by room from the rectangles: cells are numbered by their
+    # position in the compact array (room by room, row-major within a room) and no array has the size of
+    # the grid. The Neumann copies are those of compile_layout, on positions.
+    width = shape[1]
+    boxes = np.array([[coord["rowmin"], coord["rowmax"], coord["colmin"], coord["colmax"]]
+                      for coord in parameters["rooms"].values()], dtype=np.intp).reshape(-1, 4)
+    sizes = (boxes[:, 1] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 2])
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    layout = {"dx": float(parameters["domain"]["dx"]), "shape": np.array(shape), "boxes": boxes, "offsets": offsets}
+    parts = {name: [] for name in ("cells", "label", "interior", "interior_room", "neumann", "neumann_source")}
+    for number, (rowmin, rowmax, colmin, colmax) in enumerate(boxes):
+        local = np.arange(sizes[number]).reshape(rowmax - rowmin, colmax - colmin)
+        rows, cols = np.mgrid[rowmin:rowmax, colmin:colmax]
+        parts["cells"].append((rows * width + cols).ravel())
+        parts["label"].append(np.full(local.size, number, dtype=np.intp))
+        inner = local[1:-1, 1:-1].ravel()
+        parts["interior"].append(offsets[number] + inner)
+        parts["interior_room"].append(np.full(inner.size, number, dtype=np.intp))
+        source = local.copy()
+        source[0, :] = source[1, :]
+        source[-1, :] = source[-2, :]
+        source[:, 0] = source[:, 1]
+        source[:, -1] = source[:, -2]
+        boundary = np.flatnonzero(source.ravel() != local.ravel())
+        parts["neumann"].append(offsets[number] + boundary)
+        parts["neumann_source"].append(offsets[number] + source.ravel()[boundary])
+    layout.update({name: np.concatenate(values) for name, values in parts.items()})
+    room_width = (boxes[:, 3] - boxes[:, 2])[layout["interior_room"]]
+    # interior cells have all four neighbours in their own room
+    layout.update(up=layout["interior"] - room_width, down=layout["interior"] + room_width,
+                  left=layout["interior"] - 1, right=layout["interior"] + 1,
+                  interior_cells=layout["cells"][layout["interior"]], room_size=sizes.astype(float),
+                  setpoint=np.array([room["temp"] for room in parameters["rooms"].values()], dtype=float))
+
+    window = [compact_position(layout, *np.mgrid[coord["rowmin"]:coord["rowmax"], coord["colmin"]:coord["colmax"]])
+              for coord in parameters["windows"].values()]
+    window = np.concatenate([cells.ravel() for cells in window]) if window else np.zeros(0, dtype=np.intp)
+    layout["window"] = window[window >= 0]
+    door_index, door_label = [np.zeros(0, dtype=np.intp)], [np.zeros(0, dtype=np.intp)]
+    for number, coord in enumerate(parameters["doors"].values()):
+        cells = compact_position(layout, *np.mgrid[coord["rowmin"]:coord["rowmax"], coord["colmin"]:coord["colmax"]])
+        door_index.append(cells.ravel())
+        door_label.append(np.full(cells.size, number, dtype=np.intp))
+    layout["door_index"], layout["door_label"] = np.concatenate(door_index), np.concatenate(door_label)
+    layout["door_size"] = np.bincount(layout["door_label"], minlength=len(parameters["doors"])).astype(float)
+    index, partner, layout["link_weight"] = compile_links(parameters, shape)
+    layout["link_index"] = compact_position(layout, *np.divmod(index, width))
+    layout["link_partner"] = compact_position(layout, *np.divmod(partner, width))
+    if (layout["door_index"] < 0).any() or (layout["link_index"] < 0).any():
+        raise ValueError("doors and links must lie inside rooms for the sparse engine")
+    return layout
+
+
+def compact_position(layout: dict, rows, cols):
+    # position in the compact array of the cells (rows, cols), -1 outside every room
+    rows, cols = np.asarray(rows), np.asarray(cols)
+    position = np.full(rows.shape, -1, dtype=np.intp)
+    for number, (rowmin, rowmax, colmin, colmax) in enumerate(layout["boxes"]):
+        inside = (rowmin <= rows) & (rows < rowmax) & (colmin <= cols) & (cols < colmax)
+        position[inside] = layout["offsets"][number] + (rows[inside] - rowmin) * (colmax - colmin) + \
+            cols[inside] - colmin
+    return position
+
+
+class SparseStencil:
+    # The fused scheme on room cells only: they are kept in one flat array (room by room, row-major within
+    # a room), optionally in float32, and the stencil runs over interior cells with a precomputed table
+    # of the positions of their four neighbours. Cells outside every room are neither stored nor visited,
+    # and the layout (compile_sparse_layout) has no full-grid arrays either, so work and memory follow the
+    # rooms rather than the bounding box. The full grid (mirror) is only built when it is asked for, e.g.
+    # by snapshots or checkpoints through model.result_matrix; load() reads a changed grid back.
+    def __init__(self, layout: dict, radiators: Radiators = None, dtype=np.float64):
+        self.geometry = layout
+        self.radiators = radiators
+        self.cells, self.label = layout["cells"], layout["label"]
+        self.interior, self.interior_room = layout["interior"], layout["interior_room"]
+        self.up, self.down, self.left, self.right = layout["up"], layout["down"], layout["left"], layout["right"]
+        self.window = layout["window"]
+        self.neumann, self.neumann_source = layout["neumann"], layout["neumann_source"]
+        if radiators is not None:
+            # radiators stand on interior cells; where each one is in the list of interior cells
+            interior_position = np.full(self.cells.size, -1, dtype=np.intp)
+            interior_position[self.interior] = np.arange(self.interior.size)
+            self.source = interior_position[compact_position(layout, *np.divmod(radiators.cell_index,
+                                                                                 int(layout["shape"][1])))]
+
+        self.values = np.zeros(self.cells.size, dtype=dtype)
+        self.laplacian = np.empty(self.interior.size, dtype=dtype)
+        self.scratch = np.empty(self.interior.size, dtype=dtype)
+        self.centre = np.empty(self.interior.size, dtype=dtype)
+        self.dense, self.stale = None, True
+
+    def load(self, temperature):
+        self.values[...] = temperature.reshape(-1)[self.cells]
+        self.stale = True
+
+    def load_rooms(self, partial_matrix: dict):
+        # the room arrays in room order are exactly the compact array
+        self.values[...] = np.concatenate([room.ravel() for room in partial_matrix.values()])
+        self.stale = True
+
+    def store(self, temperature):
+        temperature.reshape(-1)[self.cells] = self.values
+
+    def mirror(self):
+        if self.dense is None:
+            self.dense = np.zeros(tuple(self.geometry["shape"]))
+        if self.stale:
+            self.store(self.dense)
+            self.stale = False
+        return self.dense
+
+    def room_means(self):
+        return np.bincount(self.label, weights=self.values, minlength=self.geometry["room_size"].size) / \
+            self.geometry["room_size"]
+
+    def advance(self, force, window_temp: float, setpoint, coefficient: float, time: float = 0.0,
+                scale: float = 1.0, profiler=NO_PROFILER):
+        g = self.geometry
+        values = self.values
+        values[self.window] = window_temp
+        profiler.lap("windows")
+
+        hot = self.room_means() > setpoint
+        self.hot = hot[np.newaxis]
+        profiler.lap("thermostat")
+        if force is None:
+            self.radiators.emit(time, self.hot, scale)
+        else:
+            source = force.reshape(-1)[g["interior_cells"]]
+            source[hot[self.interior_room]] = 0
+        profiler.lap("sources")
+
+        laplacian, scratch, centre = self.laplacian, self.scratch, self.centre
+        np.take(values, self.up, out=laplacian)
+        laplacian += np.take(values, self.down, out=scratch)
+        laplacian += np.take(values, self.left, out=scratch)
+        laplacian += np.take(values, self.right, out=scratch)
+        np.take(values, self.interior, out=centre)
+        np.multiply(centre, 4, out=scratch)
+        laplacian -= scratch
+        laplacian *= coefficient
+        if force is None:
+            laplacian[self.source] += self.radiators.cell_values()[0]
+        else:
+            laplacian += source
+        laplacian += centre
+        values[self.interior] = laplacian
+        profiler.lap("stencil")
+
+        values[self.neumann] = values[self.neumann_source]
+        profiler.lap("neumann")
+        flat = values.reshape(1, -1)
+        if g["door_index"].size:
+            average_doors(flat, g, g["door_label"])
+        profiler.lap("doors")
+        if g["link_index"].size:
+            exchange_links(flat, g)
+            profiler.lap("links")
+        self.stale = True
+        if force is None:
+            return self.radiators.heating()[0]
+        return source.sum()
+
+    def step(self, model, dt: float, rate: bool = False):
+        # rate as in FusedStencil.step
+        parameters = model.parameters
+        coefficient = parameters["diffusion"] * dt / parameters["domain"]["dx"] ** 2
+        time = parameters["current_time"]
+        force_dt = parameters.get("force_dt", dt)
+        if self.radiators is not None:
+            return self.advance(None, parameters["window_temp"](time), self.geometry["setpoint"], coefficient,
+                                time, dt if rate else force_dt, model.profiler)
+        # without radiators the sources come from force_term, which is a function on the full grid
+        force_term_full = np.array(parameters["force_term"](parameters["domain"]["grid"], time,
+                                                            model.mask_matrix), dtype=float)
+        force_term_full *= model.source_scale
+        if rate:
+            force_term_full *= dt / force_dt
+        model.profiler.lap("force_term")
+        return self.advance(force_term_full, parameters["window_temp"](time), self.geometry["setpoint"],
+                            coefficient, profiler=model.profiler) * parameters["domain"]["dx"] ** 2
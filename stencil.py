@@ -0,0 +1,216 @@
+import numpy as np
+
+from radiators import Radiators
+from profiling import NO_PROFILER
+
+
+def compile_geometry(parameters: dict, shape: tuple):
+    # a layout compiled once from a plan file (floorplan.compile_plan) is reused as long as the rectangles
+    # it was built from are still those in parameters; only setpoints vary per run
+    layout = parameters.get("geometry")
+    if layout is None or tuple(layout["shape"]) != tuple(shape) or layout["rectangles"] != rectangles(parameters):
+        layout = compile_layout(parameters, shape)
+    return dict(layout, setpoint=np.array([room["temp"] for room in parameters["rooms"].values()], dtype=float))
+
+
+def rectangles(parameters: dict):
+    # everything compile_layout reads from parameters, to tell whether a compiled layout still fits them
+    sides = ("rowmin", "rowmax", "colmin", "colmax")
+    parts = [(part, key) + tuple(coord[side] for side in sides)
+             for part in ("rooms", "windows", "doors") for key, coord in parameters[part].items()]
+    links = [(key,) + tuple(coord[side] for side in sides + ("row_shift", "col_shift", "weight"))
+             for key, coord in parameters.get("links", {}).items()]
+    return tuple(parts + links)
+
+
+def compile_layout(parameters: dict, shape: tuple):
+    height, width = shape
+    rooms = list(parameters["rooms"].keys())
+    room_label = np.full(shape, len(rooms), dtype=np.intp)
+    interior = np.zeros(shape, dtype=bool)
+    neumann_source = np.arange(height * width).reshape(shape)
+    for number, room in enumerate(rooms):
+        coord = parameters["rooms"][room]
+        block = np.s_[coord["rowmin"]:coord["rowmax"], coord["colmin"]:coord["colmax"]]
+        room_label[block] = number
+        interior[coord["rowmin"] + 1:coord["rowmax"] - 1, coord["colmin"] + 1:coord["colmax"] - 1] = True
+        # the same copies as the per-room Neumann boundary, replayed on indices
+        source = neumann_source[block]
+        source[0, :] = source[1, :]
+        source[-1, :] = source[-2, :]
+        source[:, 0] = source[:, 1]
+        source[:, -1] = source[:, -2]
+    neumann_source = neumann_source.ravel()
+    neumann_index = np.flatnonzero(neumann_source != np.arange(height * width))
+
+    room_size = np.bincount(room_label.ravel(), minlength=len(rooms) + 1)[:len(rooms)]
+
+    window_index = []
+    for key in parameters["windows"].keys():
+        coord = parameters["windows"][key]
+        window_index.append(np.ravel_multi_index(np.mgrid[coord["rowmin"]:coord["rowmax"],
+                                                          coord["colmin"]:coord["colmax"]].reshape(2, -1), shape))
+
+    door_index, door_label = [], []
+    for number, key in enumerate(parameters["doors"].keys()):
+        coord = parameters["doors"][key]
+        cells = np.ravel_multi_index(np.mgrid[coord["rowmin"]:coord["rowmax"],
+                                              coord["colmin"]:coord["colmax"]].reshape(2, -1), shape)
+        door_index.append(cells)
+        door_label.append(np.full(cells.size, number, dtype=np.intp))
+    door_index = np.concatenate(door_index) if door_index else np.zeros(0, dtype=np.intp)
+    door_label = np.concatenate(door_label) if door_label else np.zeros(0, dtype=np.intp)
+    door_size = np.bincount(door_label, minlength=len(parameters["doors"]))
+
+    interior_index = np.flatnonzero(interior)
+    link_index, link_partner, link_weight = compile_links(parameters, shape)
+    return {
+        "dx": float(parameters["domain"]["dx"]),
+        "shape": np.array(shape),
+        "rectangles": rectangles(parameters),
+        "room_label": room_label,
+        "room_size": room_size.astype(float),
+        "interior": interior,
+        "interior_index": interior_index,
+        "interior_room": room_label.ravel()[interior_index],
+        "neumann_index": neumann_index,
+        "neumann_source": neumann_source[neumann_index],
+        "window_index": np.concatenate(window_index) if window_index else np.zeros(0, dtype=np.intp),
+        "door_index": door_index,
+        "door_label": door_label,
+        "door_size": door_size.astype(float),
+        "link_index": link_index,
+        "link_partner": link_partner,
+        "link_weight": link_weight,
+    }
+
+
+def compile_links(parameters: dict, shape: tuple):
+    # a link exchanges a `weight` share of the temperature difference between every cell of its rectangle
+    # and the cell (row_shift, col_shift) away, each step, both ways; e.g. across a wall shared by two flats
+    index, partner, weight = [], [], []
+    for key, coord in parameters.get("links", {}).items():
+        rows, cols = np.mgrid[coord["rowmin"]:coord["rowmax"], coord["colmin"]:coord["colmax"]].reshape(2, -1)
+        cells = np.ravel_multi_index((rows, cols), shape)
+        other = np.ravel_multi_index((rows + coord["row_shift"], cols + coord["col_shift"]), shape)
+        index += [cells, other]
+        partner += [other, cells]
+        weight.append(np.full(2 * cells.size, float(coord["weight"])))
+    if not index:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), np.zeros(0)
+    index, partner, weight = np.concatenate(index), np.concatenate(partner), np.concatenate(weight)
+    if np.unique(index).size != index.size:
+        raise ValueError("links must not share cells")
+    return index, partner, weight
+
+
+def exchange_links(flat, geometry: dict):
+    # all pairs at once, from the temperatures before the exchange
+    index = geometry["link_index"]
+    flat[:, index] += geometry["link_weight"] * (flat[:, geometry["link_partner"]] - flat[:, index])
+
+
+def batch_labels(label, n_labels: int, batch: int):
+    # labels of `batch` stacked copies, shifted so that one bincount covers the whole batch
+    return (label.ravel()[np.newaxis, :] + n_labels * np.arange(batch)[:, np.newaxis]).ravel()
+
+
+def room_means(flat, geometry: dict, labels):
+    n_rooms = geometry["room_size"].size
+    sums = np.bincount(labels, weights=flat.ravel(), minlength=flat.shape[0] * (n_rooms + 1))
+    return sums.reshape(flat.shape[0], n_rooms + 1)[:, :n_rooms] / geometry["room_size"]
+
+
+def average_doors(flat, geometry: dict, labels):
+    doors = flat[:, geometry["door_index"]]
+    sums = np.bincount(labels, weights=doors.ravel(), minlength=flat.shape[0] * geometry["door_size"].size)
+    means = sums.reshape(flat.shape[0], -1) / geometry["door_size"]
+    flat[:, geometry["door_index"]] = means[:, geometry["door_label"]]
+
+
+class FusedStencil:
+    def __init__(self, geometry: dict, batch: int = 1, radiators: Radiators = None):
+        self.geometry = geometry
+        self.batch = batch
+        self.radiators = radiators
+        height, width = geometry["shape"]
+        self.inner = geometry["interior"][1:-1, 1:-1]
+        self.room_labels = batch_labels(geometry["room_label"], geometry["room_size"].size + 1, batch)
+        self.door_labels = batch_labels(geometry["door_label"], geometry["door_size"].size, batch)
+        self.laplacian = np.empty((batch, height - 2, width - 2))
+        self.scratch = np.empty((batch, height - 2, width - 2))
+
+    def advance(self, temperature, force, window_temp, setpoint, coefficient: float,
+                time: float = 0.0, scale: float = 1.0, profiler=NO_PROFILER):
+        # temperature and force are (batch, height, width); temperature is updated in place.
+        # With force=None the radiators emit (scaled by `scale`) instead of a full force grid.
+        g = self.geometry
+        flat = temperature.reshape(self.batch, -1)
+        flat[:, g["window_index"]] = np.reshape(window_temp, (-1, 1))
+        profiler.lap("windows")
+
+        # the thermostats of this step, as JitStencil keeps them (evolve_adaptive watches them)
+        self.hot = hot = room_means(flat, g, self.room_labels) > setpoint
+        profiler.lap("thermostat")
+        if force is None:
+            self.radiators.emit(time, hot, scale)
+        else:
+            force_flat = force.reshape(self.batch, -1)
+            if hot.any():
+                source = force_flat[:, g["interior_index"]]
+                source[hot[:, g["interior_room"]]] = 0
+                force_flat[:, g["interior_index"]] = source
+        profiler.lap("sources")
+
+        laplacian, scratch = self.laplacian, self.scratch
+        centre = temperature[:, 1:-1, 1:-1]
+        np.add(temperature[:, 0:-2, 1:-1], temperature[:, 2:, 1:-1], out=laplacian)
+        laplacian += temperature[:, 1:-1, 0:-2]
+        laplacian += temperature[:, 1:-1, 2:]
+        np.multiply(centre, 4, out=scratch)
+        laplacian -= scratch
+        laplacian *= coefficient
+        if force is None:
+            laplacian.reshape(self.batch, -1)[:, self.radiators.inner_index] += self.radiators.cell_values()
+        else:
+            laplacian += force[:, 1:-1, 1:-1]
+        laplacian += centre
+        np.copyto(centre, laplacian, where=self.inner)
+        profiler.lap("stencil")
+
+        flat[:, g["neumann_index"]] = flat[:, g["neumann_source"]]
+        profiler.lap("neumann")
+
+        if g["door_index"].size:
+            average_doors(flat, g, self.door_labels)
+        profiler.lap("doors")
+        if g["link_index"].size:
+            exchange_links(flat, g)
+            profiler.lap("links")
+        if force is None:
+            return self.radiators.heating()
+        return force_flat.sum(axis=1)
+
+    def step(self, model, dt: float, rate: bool = False):
+        # rate=True: sources are a rate, scaled with this dt (as in ADI), instead of a fixed amount per step
+        # of force_dt; the two agree for dt = force_dt
+        parameters = model.parameters
+        coefficient = parameters["diffusion"] * dt / parameters["domain"]["dx"] ** 2
+        force_dt = parameters.get("force_dt", dt)
+        if self.radiators is not None:
+            heating = self.advance(model.result_matrix[np.newaxis], None,
+                                   parameters["window_temp"](parameters["current_time"]),
+                                   self.geometry["setpoint"], coefficient,
+                                   parameters["current_time"], dt if rate else force_dt, model.profiler)
+            return heating[0]
+        force_term_full = np.array(parameters["force_term"](parameters["domain"]["grid"],
+                                                            parameters["current_time"],
+                                                            model.mask_matrix), dtype=float)
+        force_term_full *= model.source_scale
+        if rate:
+            force_term_full *= dt / force_dt
+        model.profiler.lap("force_term")
+        heating = self.advance(model.result_matrix[np.newaxis], force_term_full[np.newaxis],
+                               parameters["window_temp"](parameters["current_time"]),
+                               self.geometry["setpoint"], coefficient, profiler=model.profiler)
+        return heating[0] * parameters["domain"]["dx"] ** 2
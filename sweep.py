@@ -0,0 +1,149 @@
+import csv
+import itertools
+import json
+import os
+from dataclasses import dataclass, astuple, fields
+from functools import partial
+from multiprocessing import Pool
+
+import numpy as np
+
+from PROJEKTMOD import HeatingModel, model_parameters
+from convergence import ConvergenceMonitor
+from metrics import MetricsAccumulator
+
+
+@dataclass(frozen=True)
+class Scenario:
+    # radiator powers R1..R4, initial room temperatures and thermostat setpoints A1..A5
+    k1: float
+    k2: float
+    k3: float
+    k4: float
+    t1: float = 295
+    t2: float = 295
+    t3: float = 297
+    t4: float = 296
+    t5: float = 290
+    s1: float = 298
+    s2: float = 298
+    s3: float = 298
+    s4: float = 298
+    s5: float = 290
+    seed: int = 0
+
+    def parameters(self):
+        return model_parameters(*astuple(self)[:-1])
+
+    def key(self):
+        return tuple(float(value) for value in astuple(self))
+
+
+SCENARIO_FIELDS = [field.name for field in fields(Scenario)]
+
+
+def power_grid(levels=range(5), **fixed):
+    return [Scenario(k1, k2, k3, k4, **fixed) for k1, k2, k3, k4 in itertools.product(levels, repeat=4)]
+
+
+def run_scenario(scenario: Scenario, n_steps: int, dt: float, engine: str = "fused", initial_state: str = None,
+                 tolerance: float = None, sample_every: int = 10, comfort_target=None):
+    # with a tolerance the run stops once it has settled into its periodic regime;
+    # room temperatures are sampled every `sample_every` steps for the comfort numbers, which are
+    # measured against the room setpoints unless a comfort_target temperature (or one per room) is given
+    np.random.seed(scenario.seed)
+    parameters = scenario.parameters()
+    model = HeatingModel(parameters, engine=engine)
+    if initial_state is not None:
+        # branch from a pre-warmed checkpoint; only the energy of the new steps is reported
+        model.load_state(initial_state)
+        model.heatingData = []
+    monitor = ConvergenceMonitor(tolerance=tolerance, energy_tolerance=tolerance) if tolerance else None
+    metrics = MetricsAccumulator(every=sample_every, target=comfort_target)
+    model.evolve(n_steps, dt, progress=False, monitor=monitor, metrics=metrics)
+    row = dict(zip(SCENARIO_FIELDS, astuple(scenario)))
+    row.update(n_steps=n_steps, dt=dt, energy=float(model.heatingData[-1]) if len(model.heatingData) else 0.0,
+               steps_run=len(model.heatingData),
+               converged_time=monitor.converged_time if monitor and monitor.converged else np.nan,
+               energy_per_cycle=monitor.energy_per_cycle if monitor and monitor.converged else np.nan)
+    comfort_deficit = 0.0
+    for room, coord in parameters["rooms"].items():
+        mean = float(np.mean(model.result_matrix[coord["rowmin"]:coord["rowmax"], coord["colmin"]:coord["colmax"]]))
+        row[f"mean_{room}"] = mean
+        row[f"deficit_{room}"] = max(0.0, coord["temp"] - mean)
+        comfort_deficit += row[f"deficit_{room}"]
+    row["comfort_deficit"] = comfort_deficit
+    row.update(metrics.summary())
+    return row
+
+
+def run_settings(engine: str = "fused", initial_state: str = None, tolerance: float = None, comfort_target=None):
+    # everything besides the scenario, n_steps and dt that changes a row; stored with every row so that
+    # a resumed sweep only reuses rows computed the same way
+    target = comfort_target.tolist() if isinstance(comfort_target, np.ndarray) else comfort_target
+    return json.dumps({"engine": engine, "initial_state": initial_state, "tolerance": tolerance,
+                       "comfort_target": target}, sort_keys=True, default=float)
+
+
+def number(value: str):
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def read_results(path: str):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="") as handle:
+        rows = [{key: number(value) for key, value in row.items()} for row in csv.DictReader(handle)]
+    if rows and "settings" not in rows[0]:
+        raise ValueError(f"{path} has no settings column (written by an older sweep); "
+                         "its rows cannot be matched to this run, start a new results file")
+    return rows
+
+
+def sweep(scenarios: list, n_steps: int, dt: float, results_path: str = None, processes: int = None,
+          engine: str = "fused", initial_state: str = None, tolerance: float = None, comfort_target=None):
+    settings = run_settings(engine, initial_state, tolerance, comfort_target)
+    # rows of other settings stay in the file but are neither reused nor returned
+    results = [row for row in (read_results(results_path) if results_path is not None else [])
+               if row["settings"] == settings]
+    done = {(tuple(row[name] for name in SCENARIO_FIELDS), row["n_steps"], row["dt"]) for row in results}
+    pending = [scenario for scenario in scenarios if (scenario.key(), float(n_steps), float(dt)) not in done]
+    if not pending:
+        return results
+
+    handle, writer = None, None
+    try:
+        with Pool(processes) as pool:
+            for row in pool.imap_unordered(partial(run_scenario, n_steps=n_steps, dt=dt, engine=engine,
+                                                         initial_state=initial_state, tolerance=tolerance,
+                                                         comfort_target=comfort_target), pending):
+                row["settings"] = settings
+                if results_path is not None:
+                    if writer is None:
+                        new_file = not os.path.exists(results_path) or os.path.getsize(results_path) == 0
+                        fieldnames = list(row.keys())
+                        if not new_file:
+                            # keep the columns of the file being resumed
+                            with open(results_path, newline="") as existing:
+                                fieldnames = next(csv.reader(existing))
+                        handle = open(results_path, "a", newline="")
+                        writer = csv.DictWriter(handle, fieldnames=fieldnames, extrasaction="ignore")
+                        if new_file:
+                            writer.writeheader()
+                    writer.writerow(row)
+                    handle.flush()
+                results.append(row)
+    finally:
+        if handle is not None:
+            handle.close()
+    return results
+
+
+if __name__ == "__main__":
+    results = sweep(power_grid(), 10000, 0.1, "sweep.csv")
+    comfortable = [row for row in results if row["comfort_deficit"] < 1]
+    for row in sorted(comfortable, key=lambda row: row["energy"])[:10]:
+        print({name: row[name] for name in ("k1", "k2", "k3", "k4", "energy")})
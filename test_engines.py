@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from PROJEKTMOD import HeatingModel, model_parameters
+from jit import HAVE_NUMBA
+
+POWERS = (1, 0, 1, 2, 295, 295, 297, 296, 290)
+N_STEPS = 200
+
+
+def run(engine: str, dx: float):
+    np.random.seed(0)
+    return HeatingModel(model_parameters(*POWERS, dx=dx), engine=engine).evolve(N_STEPS, 0.1, progress=False)
+
+
+@pytest.fixture(scope="module", params=[1, 0.5])
+def reference(request):
+    return request.param, run("fused", request.param)
+
+
+@pytest.mark.parametrize("engine", [
+    "rooms",
+    "sparse",
+    pytest.param("jit", marks=pytest.mark.skipif(not HAVE_NUMBA, reason="needs numba")),
+    pytest.param("jit_parallel", marks=pytest.mark.skipif(not HAVE_NUMBA, reason="needs numba")),
+])
+def test_engine_matches_fused(engine, reference):
+    # every engine runs the same explicit scheme, so they agree with the NumPy one up to rounding
+    dx, fused = reference
+    model = run(engine, dx)
+    assert np.abs(model.result_matrix - fused.result_matrix).max() < 1e-9
+    assert model.heatingData[-1] == pytest.approx(fused.heatingData[-1], rel=1e-12)
+    assert model.parameters["current_time"] == pytest.approx(fused.parameters["current_time"])
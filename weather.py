@@ -0,0 +1,68 @@
+import bisect
+import csv
+import os
+
+import numpy as np
+
+
+class WeatherSeries:
+    # Outdoor temperature [K] measured at `time` [s], used as parameters["window_temp"] in place of the
+    # sine lambda. Values between samples are interpolated linearly; with `period` the series repeats
+    # (e.g. one typical day), otherwise the first/last sample is held outside the measured range.
+    # A call finds its interval by bisection in plain lists and interpolates in Python floats: as cheap as
+    # a table lookup, exact at any time (step starts, ADI midpoints, adaptive steps) and with memory that
+    # follows the series, not the length of the run.
+    def __init__(self, time, temperature, period: float = None):
+        self.time = np.asarray(time, dtype=float)
+        self.temperature = np.asarray(temperature, dtype=float)
+        if self.time.ndim != 1 or self.time.shape != self.temperature.shape or self.time.size < 1:
+            raise ValueError("time and temperature must be 1-D arrays of the same length")
+        if np.any(np.diff(self.time) <= 0):
+            raise ValueError("weather times must be strictly increasing")
+        self.period = period
+        times, values = self.time, self.temperature
+        if period is not None:
+            # one period in [0, period) and a sample either side of it, as np.interp(..., period=) does
+            order = np.argsort(self.time % period)
+            times, values = self.time[order] % period, self.temperature[order]
+            times = np.concatenate([times[-1:] - period, times, times[:1] + period])
+            values = np.concatenate([values[-1:], values, values[:1]])
+        self.times, self.values = times.tolist(), values.tolist()
+
+    @classmethod
+    def from_file(cls, path: str, time_column: str = "time", temperature_column: str = "temperature",
+                  celsius: bool = False, period: float = None):
+        # .csv with a header: time in seconds or as ISO dates (counted in seconds from the first row);
+        # .npz with `time` and `temperature` arrays; .npy with the two as rows or columns
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".csv":
+            with open(path, newline="") as handle:
+                rows = list(csv.DictReader(handle))
+            stamps = [row[time_column] for row in rows]
+            try:
+                time = np.array(stamps, dtype=float)
+            except ValueError:
+                dates = np.array(stamps, dtype="datetime64[s]")
+                time = (dates - dates[0]).astype(float)
+            temperature = np.array([row[temperature_column] for row in rows], dtype=float)
+        elif extension == ".npz":
+            with np.load(path) as data:
+                time, temperature = data[time_column], data[temperature_column]
+        elif extension == ".npy":
+            data = np.load(path)
+            time, temperature = data if data.shape[0] == 2 else data.T
+        else:
+            raise ValueError(f"unknown weather file type {extension!r}; use .csv, .npz or .npy")
+        return cls(time, np.asarray(temperature, dtype=float) + (273.15 if celsius else 0), period)
+
+    def __call__(self, t: float):
+        times, values = self.times, self.values
+        if self.period is not None:
+            t = t % self.period
+        right = bisect.bisect_right(times, t)
+        if right == 0:
+            return values[0]
+        if right == len(times):
+            return values[-1]
+        left = right - 1
+        return values[left] + (values[right] - values[left]) * (t - times[left]) / (times[right] - times[left])